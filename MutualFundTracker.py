@@ -3,20 +3,34 @@ import hashlib
 import logging
 import os
 import pathlib
-import re
 import sys
 import time
-from dataclasses import asdict
-from datetime import datetime, timedelta
+from datetime import datetime
 from json.decoder import JSONDecodeError
-from typing import Tuple
+from typing import Iterable
 
-import aiohttp
 import logs.log_config as log_config  # type: ignore # noqa
+import numpy as np
 import pytz
-import ujson as json
 from models.day_change import InvestmentData, NavData, get_investment_data
+from models.nav_date import format_nav_date, keys_to_dates, keys_to_ordinals, parse_nav_date
+from models.nav_series import NavSeries
 from util.DesktopNotification import DesktopNotification
+from util.analytics import CashFlow, compute_returns
+from util.datasets import ALL_DATASETS, HISTORY, INVESTMENT, ORDERS, UNITS, Dataset, NoFundsTracked
+from util.day_change_engine import HoldingFlow, ValuationResult, compute_valuation, holding_flows
+from util.http_client import close_http_client, get_http_client
+from util.nav_archive import NavArchive
+from util.nav_backfill import backfill_nav_history
+from util.nav_parser import NavRecord, hash_chunks, parse_nav_stream
+from util.nav_providers import NavProvider, get_default_providers, race_providers
+from util.poll_schedule import PollSchedule
+from util.portfolio_aggregates import FundContribution, apply_fund_delta, check_aggregates, contribution
+from util.rolling_metrics import TRAILING_PERIODS, rebuild_metrics, update_metrics
+from util.scheme_index import SCHEME_INDEX_FILE_NAME, SchemeIndex, ensure_scheme_index
+from util.serializer import dump_file, load_file
+from util.storage import Storage, get_storage
+from util.write_behind import WriteBehind
 
 try:
     import plotext as plt
@@ -29,6 +43,9 @@ except ImportError as e:
     from rich.console import Console
     from rich.table import Table
 
+from util.lock_manager import LockManager
+from util.lot_ledger import LotLedger
+from util.order_book import OrderBook
 from util.retry import retry
 from gdrive.GDrive import GDrive
 
@@ -55,6 +72,10 @@ def getfv(number: float) -> str:
     )
 
 
+def getfx(percentage: float | None) -> str:
+    return "N.A." if percentage is None else getfp(percentage)
+
+
 def getfp(percentage: float) -> str:
     return (
         f"[green]({roundUp3(percentage)}%)[/green]"
@@ -63,10 +84,12 @@ def getfp(percentage: float) -> str:
     )
 
 
-async def writeToFileAsync(filename: pathlib.Path, data: dict, indent=4) -> None:
-    logging.info(f"writing asynchronously to {filename=}")
-    with open(file=filename, mode="w", encoding="utf-8") as f:
-        json.dump(data, f, indent=indent)
+def getfd(drawdown: float) -> str:
+    drawdown = roundUp3(drawdown) + 0.0  # no -0.0
+    return f"[red]-{drawdown}%[/red]" if drawdown > 0 else f"{drawdown}%"
+
+
+async def uploadToDrive(filename: pathlib.Path) -> None:
     # async with GDrive(FOLDER_NAME) as gdrive:  // no profit of using events because we are using context managers, and it will trigger __aexit__ method
     #     gdrive.upload_event(filename)
     await GDrive(FOLDER_NAME).upload_async(filename)
@@ -80,47 +103,55 @@ def writeRawDataToFile(file_name: str, data: str) -> None:
 
 def writeToFile(file_name: pathlib.Path | str, data) -> None:
     logging.info("writing to a file asynchronously")
-    with open(file_name, "w") as file:
-        json.dump(data, file, indent=4)
+    dump_file(file_name, data)
 
 
 def readJsonFile(filename: str | pathlib.Path):
     logging.info("reading fileName = %s ", filename)
     if not pathlib.Path(filename).exists() or download:
         GDrive(FOLDER_NAME).download(filename)
-    with open(filename, "r") as f:
-        return json.load(f)
+    return load_file(filename)
 
 
-async def readJsonFileAsynchronously(filename: str | pathlib.Path):
-    logging.info("reading asynchronously fileName = %s", filename)
+async def downloadAsynchronously(filename: str | pathlib.Path) -> None:
     if not pathlib.Path(filename).exists() or download:
         async with GDrive(FOLDER_NAME) as gdrive:
             await gdrive.download_async(filename)
 
-    with open(filename, "r", encoding="utf-8") as f:
-        return json.load(f)
+
+async def readJsonFileAsynchronously(filename: str | pathlib.Path):
+    logging.info("reading asynchronously fileName = %s", filename)
+    await downloadAsynchronously(filename)
+    return load_file(filename)
 
 
 class MutualFund:
-    def __init__(self, is_downloadable: bool) -> None:
+    units: dict = Dataset(UNITS)
+    Orders: OrderBook = Dataset(ORDERS)
+    json_data: InvestmentData = Dataset(INVESTMENT)
+    order_history: dict[str, dict[int, list]] = Dataset(HISTORY)
+    ledger: LotLedger = Dataset(HISTORY)
 
-        self.Orders = None
-        self.units = None
-        self.Orders: dict[str:dict[str:list]]
+    def __init__(self, is_downloadable: bool, datasets: Iterable[str] = ALL_DATASETS) -> None:
+        """
+        datasets: the data files the command needs, loaded by initialize. anything else is only
+        loaded when an async step asks for it (see load)
+        """
         self.formatString = None
-        self.units: dict
         self.is_downloadable = is_downloadable
         global download
         download = self.is_downloadable
-        self.json_data: InvestmentData = None  # type: ignore
+        self.datasets = frozenset(datasets)
+        self.loaded: set[str] = set()
         self.console = Console()  # type: ignore
         self.unitsKeyList = []
         self.summaryTable = Table()
         self.TableMutualFund = Table()
-        self.tasks: list = []
-        self.nav_all_file = ""
-        self.nav_my_file = ""
+        self.writes = WriteBehind(upload=uploadToDrive)
+        self.storage: Storage = get_storage(DATA_PATH, downloadAsynchronously, self.writes)
+        self.nav_my_records: list[NavRecord] = []
+        # whether nav_my_records holds this run's feed, an empty list can also mean no tracked row
+        self.nav_records_loaded = False
         logging.info("Initializing MutualFundTracker")
         logging.info("--Application has started---")
         logging.info("--Logged in as %s --", os.environ.get("USER"))
@@ -132,6 +163,9 @@ class MutualFund:
         self.password: str = os.environ.get("shazPassword")  # type: ignore
 
         self.order_file: pathlib.Path = DATA_PATH.joinpath("order.json")
+        self.order_history_file: pathlib.Path = DATA_PATH.joinpath("order_history.json")
+        self.lots_file: pathlib.Path = DATA_PATH.joinpath("lots.json")
+        self.settled_orders = 0
 
         self.dayChangeJsonFileString: pathlib.Path = DATA_PATH.joinpath(
             "dayChange.json"
@@ -140,144 +174,224 @@ class MutualFund:
             "dayChange_bkc.json"
         )
         self.unitsFile: pathlib.Path = DATA_PATH.joinpath("units.json")
+        self.nav_archive = NavArchive(DATA_PATH.joinpath("nav_archive"))
+        self.nav_providers: list[NavProvider] = get_default_providers(DATA_PATH)
+        self.schemeIndexFile: pathlib.Path = DATA_PATH.joinpath(SCHEME_INDEX_FILE_NAME)
+        self.scheme_index: SchemeIndex | None = None
 
     async def initialize(self):
         logging.debug("----initializing----")
-        units_tasks = asyncio.create_task(
-            readJsonFileAsynchronously(self.unitsFile), name="units"
-        )
-        order_tasks = asyncio.create_task(
-            readJsonFileAsynchronously(self.order_file), name="order"
-        )
-        daychange_tasks = asyncio.create_task(
-            readJsonFileAsynchronously(self.dayChangeJsonFileString), name="daychange"
-        )
-
-        results = await asyncio.gather(units_tasks, order_tasks, daychange_tasks)
+        await self.load(*self.datasets)
+        self.console: Console
+        self.TableMutualFund = Table()
+        self.summaryTable = Table()
+        self.formatString = "%d-%b-%Y"
+        plt.datetime.set_datetime_form(date_form=self.formatString)
 
+    async def load(self, *datasets: str) -> None:
+        """
+        loads (concurrently) the datasets that aren't loaded yet
+        """
+        loaders = {
+            UNITS: self.load_units,
+            ORDERS: self.load_orders,
+            INVESTMENT: self.load_investment_data,
+            HISTORY: self.load_history,
+        }
+        missing = [dataset for dataset in dict.fromkeys(datasets) if dataset not in self.loaded]
+        if not missing:
+            return
+        logging.info("--loading %s--", ", ".join(missing))
+        await asyncio.gather(*(loaders[dataset]() for dataset in missing))
+        self.loaded.update(missing)
+
+    async def load_units(self) -> None:
         try:
-            self.units: dict = results[0]
+            self.units = await self.storage.load_units()
         except JSONDecodeError:
             # initialize to an empty dic inCase the JsonFile Doesn't exist or have invalid data
             self.units = {}
             self.run_once_initialization(self.unitsFile)
+        if not self.units:
+            raise NoFundsTracked(
+                f"No mutual Fund specified to track please Add something in {self.unitsFile} file to track"
+            )
+        self.unitsKeyList = list(self.units.keys())
+
+    async def load_orders(self) -> None:
         try:
-            self.Orders: dict[str:dict[str:list]] = results[1]
+            self.Orders = OrderBook.from_json(await self.storage.load_orders())
         except JSONDecodeError:
             print("Something went wrong with the order file")
-            self.Orders = {}
+            self.Orders = OrderBook()
             self.run_once_initialization(self.order_file)
 
-        if not self.units:
-            print(f"No mutual Fund specified to track please Add something in {self.unitsFile} file to track")
-            sys.exit(0)
-
+    async def load_investment_data(self) -> None:
         try:
-            temp_data = results[2]
-            self.json_data: InvestmentData = get_investment_data(temp_data)
+            self.json_data = await self.storage.load_investment_data()
         except (FileNotFoundError, JSONDecodeError):
             # initialize to an empty dic inCase the JsonFile Doesn't exist or have invalid data
             self.run_once_initialization(None)
-        self.unitsKeyList = list(self.units.keys())
-        self.console: Console
-        self.TableMutualFund = Table()
-        self.summaryTable = Table()
-        self.formatString = "%d-%b-%Y"
-        plt.datetime.set_datetime_form(date_form=self.formatString)
 
-    def check_past_dates(self, NavDate: str, orderDate) -> bool:
+    async def load_history(self) -> None:
+        order_history, lots = await asyncio.gather(
+            self.read_optional_json(self.order_history_file), self.read_optional_json(self.lots_file)
+        )
+        self.order_history = self.get_orders(order_history)
+        self.ledger = LotLedger.from_json(lots)
+
+    @staticmethod
+    def get_orders(data: dict[str, dict[str, list]]) -> dict[str, dict[int, list]]:
+        """
+        order files stay keyed by "%d-%b-%Y" strings, in memory the order dates are day ordinals
         """
-        to check whether the order date is equal or smaller than the (nav date - 1)
-        orders date = 13-may
-        nav -1 date = 13-may
-        in this case the orders should move to units
+        return {mfid: keys_to_ordinals(orders) for mfid, orders in data.items()}
 
-        scenario 2
+    @staticmethod
+    async def read_optional_json(file_path: pathlib.Path) -> dict:
+        """
+        files the tracker builds up itself (order history, lots), a missing one starts empty
+        """
+        try:
+            return await readJsonFileAsynchronously(file_path)
+        except (FileNotFoundError, JSONDecodeError):
+            return {}
 
-        order date = 12-May
-        nav - 1 date = 13-May
-        in this case orders should move to units file
+    def seed_ledger(self, mutualfund_id: str) -> None:
+        """
+        lots for a fund the ledger hasn't seen, from the same flows the valuation uses: what units.json
+        holds beyond the settled order history becomes one lot dated at the fund's first tracked NAV or
+        its first settled order, whichever is earlier, then the history is replayed in date order
         """
-        nav_date_format = datetime.strptime(NavDate, self.formatString)  # type: ignore
-        orderDateFormat = datetime.strptime(orderDate, self.formatString)
-        return orderDateFormat <= nav_date_format
+        if mutualfund_id in self.ledger:
+            return
+        lots = self.ledger.queue(mutualfund_id)
+        for date, units, amount in self.get_holding_flows(mutualfund_id):
+            if abs(units) < 1e-9:
+                continue
+            if units < 0:
+                self.ledger.sell(mutualfund_id, date, -units, -amount)
+            else:
+                lots.buy(date, units, amount)
+        logging.info("--seeded %s lots for %s--", len(lots), mutualfund_id)
+
+    def settle_order(self, mutualfund_id: str, date: int, order_data: list) -> None:
+        """
+        move a due order into units.json and the lot ledger. a sell (negative units / amount)
+        is matched FIFO against the lots and takes their cost basis out of the invested amount
+        """
+        self.seed_ledger(mutualfund_id)
+        units, amount = order_data
+        data = self.units[mutualfund_id]
+        if units < 0:
+            realized = self.ledger.sell(mutualfund_id, date, -units, -amount)
+            cost = sum(gain.cost for gain in realized)
+            data[0] += units
+            data[1] = round(data[1] - cost, 3)
+            logging.info(
+                "--redeemed %s units of %s, cost %.3f, gain %.3f--",
+                -units, mutualfund_id, cost, sum(gain.gain for gain in realized),
+            )
+        else:
+            self.ledger.buy(mutualfund_id, date, units, amount)
+            data[0] += units
+            data[1] += amount
+        settled = self.order_history.setdefault(mutualfund_id, {}).setdefault(date, [0, 0])
+        settled[0] += order_data[0]
+        settled[1] += order_data[1]
+        self.settled_orders += 1
+
+    def write_day_change_file(self) -> None:
+        self.storage.save_investment_data(self.json_data)
+
+    def persist_settlements(self) -> None:
+        """
+        the files touched by settling orders are written once per run, however many orders settled
+        """
+        if not self.settled_orders:
+            return
+        logging.info("--persisting %s settled orders--", self.settled_orders)
+        self.storage.save_units(self.units)
+        self.storage.save_orders(lambda: self.Orders.to_json())
+        self.writes.write(
+            self.order_history_file,
+            lambda: {mfid: keys_to_dates(orders) for mfid, orders in self.order_history.items()},
+        )
+        self.writes.write(self.lots_file, self.ledger.to_json)
+        self.settled_orders = 0
 
     async def addToUnits(self, mutualfund_id, date, name: str) -> None:
-        if mutualfund_id in self.Orders:
-            keys =  list(self.Orders[mutualfund_id].keys())
-            for key in keys:
-                if self.check_past_dates(date, key):
-                    order_data = self.Orders[mutualfund_id].pop(date)
-                    data = self.units[mutualfund_id]
-                    data[0] += order_data[0]
-                    data[1] += order_data[1]
-                    logging.info("adding units: %s and amount: %s to units for %s",
-                                 order_data[0], order_data[1], name)
-
-                    self.tasks.extend(
-                        [
-                            writeToFileAsync(self.unitsFile, self.units),  # type: ignore
-                            writeToFileAsync(self.order_file, self.Orders),  # type: ignore
-                        ]
-                    )
+        """
+        settles the orders of the fund dated on or before date (the previous NAV date): their units
+        were bought at a NAV that is already known, so they count for the day change after it
+        """
+        for order_date, order_data in self.Orders.pop_due(mutualfund_id, date):
+            self.settle_order(mutualfund_id, order_date, order_data)
+            logging.info("adding units: %s and amount: %s to units for %s",
+                         order_data[0], order_data[1], name)
+
+    async def settle_due_orders(self) -> None:
+        """
+        settles the due orders of every fund, not only of the ones whose feed row changed: an order
+        dated on or before the NAV preceding the fund's latest one is settled like day_change_method
+        would have, the moved invested amount then marks the fund as changed
+        """
+        for mutualfund_id in [key for key in self.Orders if key in self.json_data.funds]:
+            fund = self.json_data.funds[mutualfund_id]
+            previous = fund.nav.before(fund.latestNavDate)
+            if previous is not None:
+                await self.addToUnits(mutualfund_id, previous[0], fund.name)
 
     async def addToUnitsNotPreExisting(self) -> None:
         """
         Adds new mutual fund units to the unit file.
         """
-        for order_key in self.Orders:
-
-            if order_key not in self.units and self.Orders[order_key]:
-                self.units[order_key] = [0, 0]
-                for date in self.Orders[order_key]:
-                    date_data = self.Orders[order_key].pop(date)
-                    self.units[order_key][0] += date_data[0]
-                    self.units[order_key][1] += date_data[1]
-                    logging.info(
-                        "Adding new mf  units: %s and amount: %s to units for %s",
-                        date_data[0],
-                        date_data[1],
-                        order_key
-                    )
-
-                # Write the Units and Orders dictionaries to their respective files
-                self.tasks.extend(
-                    [
-                        writeToFileAsync(self.unitsFile, self.units),  # type: ignore
-                        writeToFileAsync(self.order_file, self.Orders),
-                    ]
+        for order_key in [key for key in self.Orders if key not in self.units]:
+            self.units[order_key] = [0, 0]
+            for date, date_data in self.Orders.pop_all(order_key):
+                self.settle_order(order_key, date, date_data)
+                logging.info(
+                    "Adding new mf  units: %s and amount: %s to units for %s",
+                    date_data[0],
+                    date_data[1],
+                    order_key
                 )
 
-    def add_order(self, MFID: str, unit: float, amount: float, date: str) -> None:
+    def add_order(self, MFID: str, unit: float, amount: float, date_string: str) -> None:
         """
         mfid , unit : float , amount :float , date : for ex 07-May-2022
         """
         logging.info("--adding order to Unit file--")
-        if self.Orders.__contains__(MFID) and self.Orders[MFID].__contains__(date):
-            data = self.Orders[MFID][date]
-            data[0] += unit
-            data[1] += amount
-        elif self.Orders.__contains__(MFID):
-            self.Orders[MFID][date] = [unit, amount]
-        else:
-            self.Orders[MFID] = {date: [unit, amount]}
+        self.Orders.add(MFID, parse_nav_date(date_string), unit, amount)
         logging.info(
-            f"--Adding  Units={unit}, amount={amount}, date={date} to {self.json_data.funds[MFID].name}--"
+            f"--Adding  Units={unit}, amount={amount}, date={date_string} to {self.get_scheme_name(MFID)}--"
         )
-        writeToFile(self.order_file, self.Orders)
+        self.storage.save_orders(self.Orders.to_json())
+
+    def sell_order(self, MFID: str, unit: float, amount: float, date_string: str) -> None:
+        """
+        redeem units, stored as a negative order and matched FIFO against the fund's lots once it settles
+        amount : the redemption proceeds
+        """
+        held = self.units.get(MFID, [0, 0])[0] + self.Orders.pending_units(MFID)
+        if unit > held + 1e-6:
+            logging.error("can't redeem %s units of %s, only %s held", unit, MFID, held)
+            self.console.print(f"[red]only {held} units of {self.get_scheme_name(MFID)} held[/red]")
+            return
+        self.add_order(MFID, -unit, -amount, date_string)
 
     def run_once_initialization(self, file) -> None:
         if not pathlib.Path.exists(DATA_PATH):
             pathlib.Path.mkdir(DATA_PATH)
         if file is not None:
-            writeToFile(file, data=asdict(InvestmentData()))
+            writeToFile(file, data=InvestmentData())
         elif pathlib.Path.exists(self.dayChangeJsonFileStringBackupFile):
             backup_data = readJsonFile(self.dayChangeJsonFileStringBackupFile)
             writeToFile(self.dayChangeJsonFileString, backup_data)
             self.json_data = get_investment_data(backup_data)  # type: ignore
         else:
             writeToFile(
-                self.dayChangeJsonFileStringBackupFile, asdict(InvestmentData())
+                self.dayChangeJsonFileStringBackupFile, InvestmentData()
             )
             self.json_data = InvestmentData()
 
@@ -295,6 +409,7 @@ class MutualFund:
         self.summaryTable.add_column("invested", justify="center", no_wrap=True)
         self.summaryTable.add_column("current", justify="right", no_wrap=True)
         self.summaryTable.add_column("total returns", justify="right", no_wrap=True)
+        self.summaryTable.add_column("xirr", justify="right", no_wrap=True)
         self.summaryTable.add_column("lastUpdated", justify="right", no_wrap=True)
 
         self.TableMutualFund.add_column("SCHEME NAME", justify="center")
@@ -302,6 +417,7 @@ class MutualFund:
         self.TableMutualFund.add_column("RETURNS", justify="center")
         self.TableMutualFund.add_column("CURRENT", justify="center")
         self.TableMutualFund.add_column("NAV", justify="center")
+        self.TableMutualFund.add_column("XIRR", justify="center")
 
     def summaryTableEdit(self) -> None:
         try:
@@ -331,10 +447,12 @@ class MutualFund:
         )
         dailyReturnString = f"[yellow]•[/yellow][bold]{getfv(totalDaychange)} {getfp(totalDaychangePercentage)}[/bold]"
         lastUpdatedString = f"Last Updated\n\n[b][yellow]{lastUpdated}[/yellow][/b]"
+        xirrString = f"XIRR\n\n[bold]{getfx(self.json_data.totalXirr)}[/bold]"
         self.summaryTable.add_row(
             investedString,
             currentString,
             totalReturnString + "\n" + dailyReturnString,
+            xirrString,
             lastUpdatedString,
         )
 
@@ -368,32 +486,40 @@ class MutualFund:
 
         returnString = f"₹{returns}\n\n[b]{getfp(returnsPercentage)}[/b]"
         currentString = f"₹{current}\n\n[b]₹{invested}[/b]"
-        nav_date = f"[yellow]{date}[/yellow]\n\n[b]{preMF.nav[date]}[/b]"
+        nav_date = f"[yellow]{format_nav_date(date)}[/yellow]\n\n[b]{preMF.nav[date]}[/b]"
+        xirrString = f"{getfx(preMF.xirr)}\n\n[b]NAV CAGR {getfx(preMF.cagr)}[/b]"
 
         self.TableMutualFund.add_row(
-            SchemeName, dayChangeString, returnString, currentString, nav_date
+            SchemeName, dayChangeString, returnString, currentString, nav_date, xirrString
         )
 
-    def dayChangeTableAll(self, dic: dict) -> None:
+    def dayChangeTableAll(self, result: ValuationResult) -> None:
         all_daily_table = Table(title="Day Change Total", show_lines=True, expand=True)
         all_daily_table.add_column("NAV", justify="center", no_wrap=True)
         all_daily_table.add_column("DayChange", justify="center", no_wrap=True)
-        sum_daychange_sorted_keys = sorted(
-            dic.keys(), key=lambda x: datetime.strptime(x, "%d-%b-%Y")
-        )
-        dic = {k: dic[k] for k in sum_daychange_sorted_keys}
-
+        all_daily_table.add_column("Value", justify="center", no_wrap=True)
+        all_daily_table.add_column("Invested", justify="center", no_wrap=True)
+        all_daily_table.add_column("P&L", justify="center", no_wrap=True)
         nav_col = ""
         dayChange_col = ""
-
-        for nav, dayChange in dic.items():
-            nav_col += f"[yellow]{nav}[/yellow]\n"
+        value_col = ""
+        invested_col = ""
+        pnl_col = ""
+
+        dic = result.total_series()
+        value, invested, pnl = result.portfolio_series()
+        rows = np.searchsorted(result.dates, list(dic))
+        for (nav, dayChange), row in zip(dic.items(), rows.tolist()):
+            nav_col += f"[yellow]{format_nav_date(nav)}[/yellow]\n"
             dayChange_col += f"{getfv(dayChange)}\n"
-        all_daily_table.add_row(nav_col, dayChange_col)
+            value_col += f"₹{value[row]}\n"
+            invested_col += f"₹{invested[row]}\n"
+            pnl_col += f"{getfv(pnl[row])}\n"
+        all_daily_table.add_row(nav_col, dayChange_col, value_col, invested_col, pnl_col)
         self.console.print(all_daily_table)
 
         print(end="\n\n")
-        dates: list = sum_daychange_sorted_keys
+        dates: list = [format_nav_date(date) for date in dic]
         dayChangeList: list = list(dic.values())
         plt.clear_figure()
         plt.plot_size(100, 30)
@@ -405,54 +531,89 @@ class MutualFund:
         plt.clear_color()
         plt.show()
 
+    def gains_table(self) -> None:
+        """
+        realized and unrealized capital gains per fund, split into short and long term by lot age
+        """
+        logging.info("--rendering capital gains table--")
+        gains_table = Table(title="Capital Gains", show_lines=True, expand=True)
+        for column in ("SCHEME NAME", "REALIZED STCG", "REALIZED LTCG", "UNREALIZED ST", "UNREALIZED LT", "LOTS"):
+            gains_table.add_column(column, justify="center", no_wrap=True)
+
+        totals = [0.0, 0.0, 0.0, 0.0]
+        for key in self.units:
+            fund = self.json_data.funds.get(key)
+            if fund is None or fund.latestNavDate not in fund.nav:
+                continue
+            self.seed_ledger(key)
+            gains = self.ledger.capital_gains(key, fund.latestNavDate, fund.nav[fund.latestNavDate])
+            row = [gains.realized_short, gains.realized_long, gains.unrealized_short, gains.unrealized_long]
+            totals = [total + value for total, value in zip(totals, row)]
+            gains_table.add_row(
+                fund.name, *(getfv(value) for value in row), str(len(self.ledger.queue(key)))
+            )
+        gains_table.add_row("[b]Total[/b]", *(f"[b]{getfv(value)}[/b]" for value in totals), "")
+        self.console.print(gains_table)
+
+    def metrics_table(self) -> None:
+        logging.info("--rendering performance metrics table--")
+        metrics_table = Table(title="Performance", show_lines=True, expand=True)
+        # a fixed width: rich squeezes wrappable columns to nothing before the no_wrap ones, min_width or not
+        metrics_table.add_column("SCHEME NAME", justify="center", width=20)
+        for column in [*TRAILING_PERIODS, "MAX DRAWDOWN", "VOLATILITY", "SHARPE"]:
+            metrics_table.add_column(column, justify="center", no_wrap=True)
+
+        for key in self.units:
+            fund = self.json_data.funds.get(key)
+            if fund is None:
+                continue
+            if fund.metrics.lastDate != fund.latestNavDate:
+                fund.metrics = rebuild_metrics(fund.nav)
+            metrics = fund.metrics
+            metrics_table.add_row(
+                fund.name,
+                *(getfx(metrics.trailingReturns.get(period)) for period in TRAILING_PERIODS),
+                getfd(metrics.maxDrawdown),
+                getfx(metrics.volatility),
+                "N.A." if metrics.sharpe is None else str(metrics.sharpe),
+            )
+        self.console.print(metrics_table)
+
     def UpdateKeyList(self):
         self.unitsKeyList = self.units.keys()
 
     async def day_change_table(self):
         logging.info("--rendering day change table--")
+        await self.load(UNITS, INVESTMENT, HISTORY)
         daily_table = Table(title="Day Change table", show_lines=True, expand=True)
         daily_table.add_column("SCHEME NAME", justify="center", no_wrap=True)
         daily_table.add_column("NAV", justify="center", no_wrap=True)
         daily_table.add_column("DayChange", justify="center", no_wrap=True)
 
-        sum_day_change: dict = {}
         self.UpdateKeyList()
         for key in self.unitsKeyList:
             if not self.json_data.funds.__contains__(key):
                 await self.get_current_values()
-            value = self.json_data.funds[key].nav
-            name: str = self.json_data.funds[key].name
-            units: float = self.units[key][0]
+
+        result = compute_valuation(
+            {key: self.json_data.funds[key].nav for key in self.unitsKeyList},
+            {key: self.get_holding_flows(key) for key in self.unitsKeyList},
+        )
+        for key in self.unitsKeyList:
             nav_col = ""
             daychange_col = ""
-            i = True
-            prev_day_change = 0.0
-
-            for nav, daychange in value.items():
-                if i:
-                    prev_day_change = units * daychange
-                    i = False
-                    continue
-                daychange *= units
-                daychange_data: float = round(daychange - prev_day_change, 3)
-
-                if nav in sum_day_change:
-                    sum_day_change[nav] += daychange_data
-                else:
-                    sum_day_change[nav] = daychange_data
-                nav_col += f"[yellow]{nav}[/yellow]\n"
-
+            for nav, daychange_data in result.fund_series(key).items():
+                nav_col += f"[yellow]{format_nav_date(nav)}[/yellow]\n"
                 daychange_col += f"{getfv(daychange_data)}\n"
-                prev_day_change = daychange
 
-            daily_table.add_row(name, nav_col, daychange_col)
+            daily_table.add_row(self.json_data.funds[key].name, nav_col, daychange_col)
 
         if not self.console:
             self.console = Console()
         print("\n")
         self.console.print(daily_table)
         print("\n")
-        self.dayChangeTableAll(sum_day_change)
+        self.dayChangeTableAll(result)
 
     def draw_table(self):
         self.initializeTables()
@@ -464,20 +625,15 @@ class MutualFund:
             self.MutualFundTableEdit(ids)
         self.console.print(self.TableMutualFund)
 
-    def get_grep_string(self) -> str:
-        unitKeyList = list(self.units.keys())
-
-        return "".join(
-            unitKeyList[i] if i == 0 else f"|{unitKeyList[i]}"
-            for i in range(len(unitKeyList))
-        )
+    def get_scheme_codes(self) -> frozenset[str]:
+        return frozenset(self.units.keys())
 
     def draw_graph(self) -> None:
         for ids in self.unitsKeyList:
             value = self.json_data.funds[ids]
             print()
-            x = value.nav.keys()
-            y = value.nav.values()
+            x = [format_nav_date(date) for date in value.nav]
+            y = value.nav.values().tolist()
             plt.plot_size(100, 30)
             plt.title(value["name"])
             plt.xlabel("Date", xside="upper")
@@ -490,201 +646,389 @@ class MutualFund:
             plt.clear_figure()
         print()
 
+    @staticmethod
+    def get_fingerprint(record: NavRecord) -> str:
+        return hashlib.md5(record.raw.encode()).hexdigest()
+
+    def get_changed_records(self) -> list[NavRecord]:
+        """
+        tracked rows whose feed line differs from the one last applied to the fund,
+        plus the funds whose invested amount moved since then
+        """
+        changed = []
+        for record in self.nav_my_records:
+            fund = self.json_data.funds.get(record.scheme_code)
+            if (
+                    fund is None
+                    or fund.fingerprint != self.get_fingerprint(record)
+                    or fund.invested != self.units[record.scheme_code][1]
+            ):
+                changed.append(record)
+        return changed
+
     async def update_my_nav_file(self):
-        if self.nav_all_file is None and not self.download_all_nav_file():
+        if not self.nav_records_loaded and not await self.download_all_nav_file():
             return False
 
-        pattern = self.get_grep_string()
-        result = "".join(
-            i.strip() + "\n"
-            for i in self.nav_all_file.splitlines()
-            if re.search(pattern, i)
+        if not self.get_changed_records():
+            logging.info("--Nothing to update--")
+            return False
+
+        self.json_data.hash2 = hashlib.md5(
+            "".join(self.get_fingerprint(record) for record in self.nav_my_records).encode()
+        ).hexdigest()
+        lastUpdated = datetime.now(INDIAN_TIMEZONE).strftime(
+            f"{self.formatString} %X"
         )
-        self.nav_my_file = result
-        if self.json_data.hash2 is not None:
-            new_hash = hashlib.md5(self.nav_my_file.encode()).hexdigest()
-            prev_hash = self.json_data.hash2
-            if prev_hash == new_hash:
-                logging.info("--Nothing to update--")
-                return False
-            self.json_data.hash2 = new_hash
-            lastUpdated = datetime.now(INDIAN_TIMEZONE).strftime(
-                f"{self.formatString} %X"
-            )
-            self.json_data.lastUpdated = lastUpdated
-            self.tasks.append(
-                writeToFileAsync(
-                    self.dayChangeJsonFileStringBackupFile,
-                    await readJsonFileAsynchronously(self.dayChangeJsonFileString),
-                )
-            )
-            DesktopNotification("Mutual Fund Tracker", f"Updated at {lastUpdated}")
+        self.json_data.lastUpdated = lastUpdated
+        await self.storage.backup()
+        DesktopNotification("Mutual Fund Tracker", f"Updated at {lastUpdated}")
 
         return True
 
+    def get_scheme_name(self, scheme_code: str) -> str:
+        if INVESTMENT in self.loaded and scheme_code in self.json_data.funds:
+            return self.json_data.funds[scheme_code].name
+        if self.scheme_index is None:
+            self.scheme_index = SchemeIndex.load(self.schemeIndexFile)
+        if self.scheme_index is None:
+            return scheme_code
+        return self.scheme_index.name_of(scheme_code, scheme_code)
+
+    def get_conditional_headers(self, provider: NavProvider) -> dict[str, str]:
+        """
+        validators of the last downloaded feed, lets the server answer 304 without sending the body.
+        they are only meaningful to the provider that issued them
+        """
+        headers = {}
+        if provider.name != self.json_data.validatorSource:
+            return headers
+        if self.json_data.etag:
+            headers["If-None-Match"] = self.json_data.etag
+        if self.json_data.lastModified:
+            headers["If-Modified-Since"] = self.json_data.lastModified
+        return headers
+
     @retry(retries=3, delay=1, fail_after_retry_exhausted=False)
     async def download_all_nav_file(self) -> bool:
         logging.info("--downloading the NAV file from server--")
 
-        async with aiohttp.client.ClientSession() as client:
-            start_time = time.time()
-            res = await client.get(
-                "https://www.amfiindia.com/spages/navopen.txt", timeout=20
-            )
-            status = res.status
-            text = await res.text()
-
-            if status != 200:
-                logging.error(f"HTTP status: {status}")
-                raise ValueError(f"HTTP status: {status}")
+        client = get_http_client().session
+        start_time = time.time()
+        feed = await race_providers(
+            self.nav_providers,
+            client,
+            self.get_conditional_headers,
+            today=datetime.now(INDIAN_TIMEZONE).replace(tzinfo=None),
+            newer_than=max(
+                (self.json_data.funds[code].latestNavDate for code in self.get_scheme_codes()
+                 if code in self.json_data.funds),
+                default=0,
+            ),
+        )
+        if feed.not_modified:
+            logging.info("--NAV file not modified since the last download--")
+            return False
 
-            else:
-                self.nav_all_file = text
-                logging.info(
-                    f"--took {(time.time() - start_time):.2f} Secs to download the file"
+        # the feed is parsed while it is still arriving, only the tracked rows are kept around
+        md5 = hashlib.md5()
+        archive_writer = self.nav_archive.writer()
+        try:
+            self.nav_my_records = [
+                record
+                async for record in parse_nav_stream(
+                    archive_writer.tee(hash_chunks(feed.chunks, md5)),
+                    self.get_scheme_codes(),
                 )
-                new_hash = hashlib.md5(self.nav_all_file.encode()).hexdigest()
-                if self.json_data.hash:
-                    prev_hash = self.json_data.hash
-                    if prev_hash == new_hash:
-                        logging.info("--No changes found in the new NAV file--")
-                        return False
-                self.json_data.hash = new_hash
+            ]
+            self.nav_records_loaded = True
+        except BaseException:
+            archive_writer.abort()
+            feed.close(abort=True)
+            raise
+        feed.close()
+        new_hash = md5.hexdigest()
+        archive_writer.commit(new_hash)
+        validators = (self.json_data.etag, self.json_data.lastModified, self.json_data.validatorSource)
+        # the same content from another provider keeps the stored validators, they still hold for the
+        # provider that issued them and switching would make the two alternate and never get a 304
+        same_from_another = (
+                new_hash == self.json_data.hash and self.json_data.validatorSource not in ("", feed.provider)
+        )
+        if not same_from_another and validators != (feed.etag, feed.last_modified, feed.provider):
+            self.json_data.etag = feed.etag
+            self.json_data.lastModified = feed.last_modified
+            self.json_data.validatorSource = feed.provider
+            # saved even when no tracked fund changes, or every run downloads the whole feed again
+            self.write_day_change_file()
 
-                return True
+        logging.info(
+            f"--took {(time.time() - start_time):.2f} Secs to download the file"
+        )
+        self.scheme_index = await ensure_scheme_index(
+            self.schemeIndexFile, self.nav_archive, new_hash
+        )
+        if self.json_data.hash:
+            prev_hash = self.json_data.hash
+            if prev_hash == new_hash:
+                logging.info("--No changes found in the new NAV file--")
+                return False
+        self.json_data.hash = new_hash
+        self.write_day_change_file()
+
+        return True
+
+    async def load_archived_nav_file(self, content_hash: str | None = None) -> bool:
+        """
+        fill the tracked NAV rows from an archived snapshot instead of the network,
+        the latest snapshot is used when no hash is given
+        """
+        content_hash = content_hash or self.nav_archive.latest()
+        if content_hash is None or content_hash not in self.nav_archive:
+            logging.error("NAV snapshot %s not found in the archive", content_hash)
+            return False
+        self.nav_my_records = [
+            record async for record in self.nav_archive.parse(content_hash, self.get_scheme_codes())
+        ]
+        self.nav_records_loaded = True
+        logging.info("--loaded %s rows from archived NAV snapshot %s--", len(self.nav_my_records), content_hash)
+        return True
+
+    async def backfill(self, paths: list[str]) -> None:
+        """
+        import AMFI NAV history report files from disk into the tracked funds' histories
+        """
+        await self.load(UNITS, INVESTMENT)
+        added = backfill_nav_history(self.json_data, paths, self.get_scheme_codes())
+        if not added:
+            logging.info("--backfill found no new NAV dates--")
+            return
+        for scheme_code in added:
+            fund = self.json_data.funds[scheme_code]
+            fund.metrics = rebuild_metrics(fund.nav)
+        self.storage.resync_nav(added)
+        self.write_day_change_file()
 
     async def day_change_method(
-            self, ids: str, today_nav: float, latest_nav_date: str, name: str
+            self, ids: str, today_nav: float, latest_nav_date: int, name: str
     ) -> float:
         self.is_existing_id(ids, name, latest_nav_date, today_nav)
         data = self.json_data.funds[ids].nav
-        latestDate = datetime.strptime(latest_nav_date, self.formatString)
-
-        prev_day_nav_date: str = datetime.strftime(
-            latestDate - timedelta(1), self.formatString
-        )
 
-        if prev_day_nav_date not in data:
-            key_list = list(data.keys())
-            length = len(key_list)
-            if length == 0:
-                data[latest_nav_date] = today_nav
-                return -1
-            elif length == 1 and key_list[-1] == latest_nav_date:
-                return -1
-            elif key_list[-1] == latest_nav_date:
-                prev_day_nav_date = key_list[-2]
-            else:
-                prev_day_nav_date = key_list[-1]
+        previous = data.before(latest_nav_date)
+        if previous is None:
+            data[latest_nav_date] = today_nav
+            self.update_fund_metrics(ids)
+            return -1
+        prev_day_nav_date, prev_day_nav = previous
 
         await self.addToUnits(ids, prev_day_nav_date, name)
         units: float = self.units[ids][0]
 
-        prevDaySum: float = data[prev_day_nav_date] * units
+        prevDaySum: float = prev_day_nav * units
         dayChange: float = round(today_nav * units - prevDaySum, 3)
         self.json_data.funds[ids].dayChange = dayChange
         data[latest_nav_date] = today_nav
+        self.update_fund_metrics(ids)
         return dayChange
 
+    def update_fund_metrics(self, ids: str) -> None:
+        fund = self.json_data.funds[ids]
+        fund.metrics = update_metrics(fund.metrics, fund.nav)
+
     def is_existing_id(
-            self, ids: str, name: str, latest_nav_date: str, today_nav: float
+            self, ids: str, name: str, latest_nav_date: int, today_nav: float
     ) -> None:
         if not self.json_data.funds.__contains__(ids):
             self.json_data.funds[ids] = NavData()
             self.json_data.funds[ids].name = name
-            self.json_data.funds[ids].nav = {latest_nav_date: today_nav}
+            self.json_data.funds[ids].nav = NavSeries([latest_nav_date], [today_nav])
             self.json_data.funds[ids].latestNavDate = latest_nav_date
 
     async def clean_up(self) -> None:
-        keys: list[str] = list(self.json_data.funds.keys())
-        for key in keys:
-            if key.isnumeric() and key not in self.units:
-                del self.json_data.funds[key]
-
-        self.tasks.append(
-            writeToFileAsync(self.dayChangeJsonFileString, asdict(self.json_data))
-        )
-
-    async def read_my_nav_file(self) -> Tuple[float, float, float]:
         """
-        returns subtotal, total_invested , totaldaychange
+        drop the funds removed from units.json, taking them out of the running totals
         """
+        removed = [key for key in self.json_data.funds if key.isnumeric() and key not in self.units]
+        for key in removed:
+            fund = self.json_data.funds.pop(key)
+            apply_fund_delta(self.json_data, contribution(fund), FundContribution())
+            logging.info("--removed %s, no longer in units--", key)
 
-        sum_total = 0
-        total_invested = 0
-        total_day_change = 0
+        if removed:
+            self.write_day_change_file()
 
-        for line in self.nav_my_file.splitlines():
-            temp = line.strip().split(";")
-            _id, name, nav, date = (
-                temp[0],
-                temp[3].split("-")[0].strip(),
-                float(temp[4]),
-                temp[5],
-            )
+    async def read_my_nav_file(self) -> int:
+        """
+        recomputes only the funds whose feed row changed, the portfolio totals in json_data are
+        running aggregates moved by each fund's delta. returns the number of funds updated
+        """
+        changed_records = self.get_changed_records()
+        logging.info(
+            "--%s of %s tracked funds changed--", len(changed_records), len(self.nav_my_records)
+        )
+        for record in changed_records:
+            _id, name, nav, date = record.scheme_code, record.name, record.nav, record.date
+            before = contribution(self.json_data.funds.get(_id))
 
             # type: ignore
             dayChange: float = await self.day_change_method(_id, nav, date, name)
 
-            current = round(self.units[_id][0] * nav, 3)
-            invested = self.units[_id][1]
-            sum_total += current
-            total_invested += invested
-            if dayChange != -1:
-                total_day_change += dayChange
-
             cur_json_id = self.json_data.funds[_id]
             cur_json_id.latestNavDate = date
-            cur_json_id.current = current
-            cur_json_id.invested = invested
+            cur_json_id.current = round(self.units[_id][0] * nav, 3)
+            cur_json_id.invested = self.units[_id][1]
             cur_json_id.dayChange = dayChange
-        return sum_total, total_invested, total_day_change
+            cur_json_id.fingerprint = self.get_fingerprint(record)
+            apply_fund_delta(self.json_data, before, contribution(cur_json_id))
+        return len(changed_records)
 
-    async def get_current_values(self) -> None:
+    def check_totals(self, repair: bool = False) -> bool:
+        """
+        verify the running portfolio totals against a full recompute over the funds
+        """
+        mismatches = check_aggregates(self.json_data, self.get_scheme_codes(), repair=repair)
+        if not mismatches:
+            self.console.print("[green]portfolio totals are consistent[/green]")
+            return True
+        for mismatch in mismatches:
+            self.console.print(f"[red]{mismatch}[/red]")
+        if repair:
+            self.write_day_change_file()
+        return False
+
+    def get_holding_flows(self, fund_id: str) -> list[HoldingFlow]:
+        """
+        dated unit / amount changes of the fund, see holding_flows for the units bought before
+        the order history existed
+        """
+        fund = self.json_data.funds.get(fund_id)
+        held_units, invested = self.units.get(fund_id, [0, 0])
+        return holding_flows(
+            self.order_history.get(fund_id, {}),
+            held_units,
+            invested,
+            self.ledger.realized_cost(fund_id),
+            fund.nav.dates[0] if fund is not None and fund.nav else 0,
+        )
+
+    def get_cash_flows(self, fund_id: str) -> list[CashFlow]:
+        """
+        purchases as outflows and redemptions as inflows
+        """
+        return [(date, -amount) for date, _, amount in self.get_holding_flows(fund_id)]
+
+    def update_returns(self) -> None:
+        """
+        XIRR of every fund and of the portfolio, recomputed on every update (one batched solve)
+        """
+        fund_ids = [key for key in self.unitsKeyList if key in self.json_data.funds]
+        funds = self.json_data.funds
+        result = compute_returns(
+            {key: self.get_cash_flows(key) for key in fund_ids},
+            {key: (funds[key].latestNavDate, funds[key].current) for key in fund_ids},
+            {key: funds[key].nav for key in fund_ids},
+        )
+        for key in fund_ids:
+            funds[key].xirr = result.xirr[key]
+            funds[key].cagr = result.cagr[key]
+        self.json_data.totalXirr = result.total_xirr
+
+    async def get_current_values(self) -> bool:
+        """
+        returns whether anything was recomputed
+        """
 
         logging.info("--Main calculation--")
+        await self.load(*ALL_DATASETS)
         if self.is_downloadable:
             await self.addToUnitsNotPreExisting()
+            await self.clean_up()
             if not await self.download_all_nav_file():
-                return
+                return False
+            await self.settle_due_orders()
 
             if not await self.update_my_nav_file():  # type: ignore
-                return
-
-        sum_total, total_invested, total_daychange = await self.read_my_nav_file()
-
-        total_profit = sum_total - total_invested
-        total_profit_percentage = total_profit / total_invested * 100
+                return False
 
-        total_profit_percentage = round(total_profit_percentage, 3)
-        total_profit = round(total_profit, 3)
-        total_daychange = round(total_daychange, 3)
+        await self.read_my_nav_file()
+        self.update_returns()
+        self.write_day_change_file()
+        return True
 
-        self.json_data.totalProfit = total_profit
-        self.json_data.sumTotal = round(sum_total, 3)
-        self.json_data.totalInvested = total_invested
-        self.json_data.totalProfitPercentage = total_profit_percentage
+    def reload_if_modified(self) -> None:
+        """
+        pick up data files changed by another process (e.g. -add, -backfill) while the daemon was
+        sleeping, so the next write doesn't overwrite them with the older state
+        """
+        units, orders, investment_data = self.storage.external_changes()
+        if units is not None:
+            self.units = units
+        if orders is not None:
+            self.Orders = OrderBook.from_json(orders)
+        if investment_data is not None:
+            self.json_data = investment_data
+        self.unitsKeyList = list(self.units.keys())
 
-        self.json_data.totalDaychange = total_daychange
-        self.tasks.append(
-            writeToFileAsync(self.dayChangeJsonFileString, data=asdict(self.json_data))
-        )
+    async def run_daemon(self, schedule: PollSchedule | None = None) -> None:
+        """
+        keep the event loop, the pooled http session and the parsed state alive and poll the NAV feed
+        around the publish window, every poll runs the same pipeline as get_current_values
+        """
+        schedule = schedule or PollSchedule()
+        self.is_downloadable = True
+        await self.load(*ALL_DATASETS)
+        self.storage.external_changes()
+        logging.info("--starting NAV polling daemon--")
+        while True:
+            changed = False
+            with LockManager(lock_file) as lock_acquired:
+                if lock_acquired:
+                    try:
+                        self.reload_if_modified()
+                        self.nav_my_records = []
+                        self.nav_records_loaded = False
+                        changed = await self.get_current_values()
+                        await self.del_cleanup()
+                    except Exception as error_occurred:
+                        logging.exception("NAV poll failed: %r", error_occurred)
+                        await self.recover_from_failed_poll()
+            delay = schedule.next_delay(datetime.now(INDIAN_TIMEZONE), changed)
+            logging.info("--next NAV poll in %.0f Secs--", delay)
+            await asyncio.sleep(delay)
+
+    async def recover_from_failed_poll(self) -> None:
+        """
+        the failed poll may have half applied the feed in memory (orders popped, NAVs appended,
+        totals moved): drop its writes and reload every dataset as last persisted. the validators
+        and hash are cleared too, so the next poll downloads and applies the feed again instead of
+        being told nothing changed
+        """
+        self.storage.discard()
+        self.writes.discard()
+        self.settled_orders = 0
+        self.loaded.clear()
+        try:
+            await self.load(*ALL_DATASETS)
+        except Exception as error_occurred:
+            # retried by the next poll, get_current_values loads what isn't loaded
+            logging.exception("reloading after the failed poll failed: %r", error_occurred)
+            return
+        self.json_data.etag = self.json_data.lastModified = self.json_data.validatorSource = ""
+        self.json_data.hash = ""
 
     async def del_cleanup(self):
         """
 
         :return:
         """
-        if self.tasks:
-            start_time = time.time()
-
-            await asyncio.gather(*self.tasks)
-
-            logging.debug(f"---Took {(time.time() - start_time):.2f} Secs to complete the tasks---")
-        else:
-            logging.debug("No tasks to run")
+        self.persist_settlements()
+        start_time = time.time()
+        await self.storage.flush()
+        if self.writes:
+            await self.writes.flush()
+        logging.debug(f"---Took {(time.time() - start_time):.2f} Secs to flush the writes---")
 
-        self.tasks.clear()
         # lock_manager.release_control()
 
     async def __aenter__(self):
@@ -693,6 +1037,7 @@ class MutualFund:
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         await self.del_cleanup()
+        await close_http_client()
         return False
 
 
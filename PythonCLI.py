@@ -1,8 +1,10 @@
 import argparse
 import asyncio
 import os
+import sys
 
 from MutualFundTracker import MutualFund, lock_file
+from util.datasets import ALL_DATASETS, HISTORY, INVESTMENT, ORDERS, UNITS, NoFundsTracked
 from util.lock_manager import LockManager
 
 git_dir = os.path.dirname(__file__)
@@ -31,6 +33,30 @@ def clear_logs():
         file_.truncate()
 
 
+def command_datasets(args) -> frozenset[str]:
+    """
+    the data files the command reads, in the same order the commands are dispatched below.
+    anything recomputing from the NAV feed needs everything
+    """
+    if args.add is not None:
+        return frozenset({ORDERS})
+    if args.sell is not None:
+        return frozenset({UNITS, ORDERS})
+    if args.gains == "y":
+        return frozenset({UNITS, INVESTMENT, HISTORY})
+    if args.metrics == "y":
+        return frozenset({UNITS, INVESTMENT})
+    if args.check != "n":
+        return frozenset({UNITS, INVESTMENT})
+    if args.backfill is not None:
+        return frozenset({UNITS, INVESTMENT})
+    if args.replay is not None or "y" in (args.dc, args.r, args.d):
+        return ALL_DATASETS
+    if args.dash == "y":
+        return frozenset()
+    return frozenset({UNITS, INVESTMENT})
+
+
 async def call_mutual_fund(args) -> None:  # pragma: no cover
     """
     Call the mutual fund tracker
@@ -44,16 +70,47 @@ async def call_mutual_fund(args) -> None:  # pragma: no cover
     if args.logs == "clear":
         clear_logs()
         return
+    if args.daemon == "y":
+        # the daemon takes the lock for every poll, so -add still works while it sleeps
+        async with MutualFund(True) as tracker:
+            await tracker.run_daemon()
+        return
+
     with LockManager(lock_file) as lock_acquired:
         if not lock_acquired:
             return
-        async with MutualFund(args.d == 'y') as tracker:
+        async with MutualFund(args.d == 'y', command_datasets(args)) as tracker:
 
             if args.add is not None:
                 tracker.add_order(
                     args.add[0], float(args.add[1]), float(args.add[2]), args.add[3]
                 )
                 return
+            if args.sell is not None:
+                tracker.sell_order(
+                    args.sell[0], float(args.sell[1]), float(args.sell[2]), args.sell[3]
+                )
+                return
+            if args.gains == "y":
+                tracker.gains_table()
+                return
+            if args.metrics == "y":
+                tracker.metrics_table()
+                return
+            if args.check != "n":
+                tracker.check_totals(repair=args.check == "repair")
+                return
+            if args.backfill is not None:
+                await tracker.backfill(args.backfill)
+                return
+            if args.replay is not None:
+                tracker.is_downloadable = False
+                if await tracker.load_archived_nav_file(
+                        None if args.replay == "latest" else args.replay
+                ):
+                    await tracker.get_current_values()
+                    tracker.draw_table()
+                return
             if args.dc == "y":
                 await tracker.day_change_table()
                 return
@@ -104,11 +161,40 @@ async def main():
     parser.add_argument(
         "-add", nargs="+", type=str, help="Mf unit amount date [dd-mon-yyyy]"
     )
+    parser.add_argument(
+        "-sell", nargs="+", type=str, help="Mf unit proceeds date [dd-mon-yyyy]"
+    )
+    parser.add_argument(
+        "-gains", type=str, choices=choices, default="n",
+        help="short / long term capital gains of the FIFO matched lots",
+    )
+    parser.add_argument(
+        "-metrics", type=str, choices=choices, default="n",
+        help="trailing returns, drawdown, volatility and sharpe ratio per fund",
+    )
+    parser.add_argument(
+        "-check", type=str, choices=["y", "repair", "n"], default="n",
+        help="verify the stored portfolio totals against a full recompute",
+    )
     parser.add_argument("--logs", type=str, choices=["show", "clear", "n"], default="n")
+    parser.add_argument(
+        "-replay", type=str, help="recompute from an archived NAV snapshot [hash|latest]"
+    )
+    parser.add_argument(
+        "-backfill", nargs="+", type=str, help="AMFI NAV history report files to import"
+    )
+    parser.add_argument(
+        "-daemon", type=str, choices=["y", "n"], default="n",
+        help="keep running and poll the NAV feed around the publish window",
+    )
     parser.add_argument("-dash", type=str, choices=["y", "n"], default="n")
 
     args = parser.parse_args()
-    await call_mutual_fund(args)
+    try:
+        await call_mutual_fund(args)
+    except NoFundsTracked as error:
+        print(error)
+        sys.exit(0)
 
 
 if __name__ == "__main__":
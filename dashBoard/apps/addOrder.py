@@ -1,4 +1,3 @@
-from dataclasses import asdict
 from datetime import date, datetime
 
 import dash_bootstrap_components as dbc
@@ -178,12 +177,11 @@ def update_output(value):
     if value is None or value == "":
         return "Please select a product"
 
-    day_change = asdict(helper.daychange_json)
-    funds = day_change["funds"]
+    funds = helper.daychange_json.funds
     # check if the fund is in the funds
 
     if value not in funds:
         return "No data available for this fund"
     fund = funds[value]
-    return f"Invested {fund['invested']} Current {fund['current']} Day Change {fund['dayChange']}"
+    return f"Invested {fund.invested} Current {fund.current} Day Change {fund.dayChange}"
 
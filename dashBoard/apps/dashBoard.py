@@ -59,6 +59,9 @@ def prepare_summary_table(summary_table)->list[html.Table]:
                     td = html.Td()
                     td.children = [html.Font(summary_table[x][y], style={
                                              'font-weight': 'bold', 'color': '#ac6f05'})]
+                elif y == 4 and summary_table[x][y] != "N.A.":
+                    td = html.Td()
+                    td.children = [percentage(summary_table[x][y])]
                 else:
                     td = html.Td(summary_table[x][y])
                 tr.children.append(td)
@@ -102,6 +105,11 @@ def prepare_children_mut_tab(MutualFund_table):
                     td = html.Td()
                     td.children = [html.Font(
                         _1, style={'font-weight': 'bold', 'color': '#ac6f05'}), html.Br(), html.Br(), _2]
+                elif y == 5:
+                    _1, _2 = MutualFund_table[x][y].split(" ")
+                    td = html.Td()
+                    td.children = [percentage(_1) if _1 != "N.A." else _1, html.Br(), html.Br(),
+                                   "NAV CAGR " + _2]
 
                 else:
                     td = html.Td(
@@ -124,7 +132,12 @@ def prepareTable() -> list[dbc.Table]:
 
     mut_tab = dbc.Table(children=children_mut_tab,
                         striped=True, bordered=True, hover=True, className="table table-sm")
-    return [sum_tab, html.Br(), html.Br(), mut_tab]
+    metrics_table = helper.getMetricsTableData()
+    metrics_tab = dbc.Table(children=[
+        html.Thead(html.Tr([html.Th(x) for x in metrics_table[0]])),
+        html.Tbody([html.Tr([html.Td(x) for x in row]) for row in metrics_table[1:]]),
+    ], striped=True, bordered=True, hover=True, className="table table-sm")
+    return [sum_tab, html.Br(), html.Br(), mut_tab, html.Br(), html.Br(), metrics_tab]
 
 
 layout = dbc.Container(children=[
@@ -187,6 +200,22 @@ layout = dbc.Container(children=[
         }),
     ], className="graph"),
 
+    html.Div(children=[
+        dcc.Graph(id='my-graph6', figure={
+            'data': helper.getPortfolioValue(),
+            'layout': {
+                'title': 'Portfolio Value',
+                'xaxis': {'title': 'Date'},
+                'yaxis': {'title': 'Amount'},
+                'hovermode': 'closest',
+                'legend': {'x': 0, 'y': 1},
+                'transition': {'duration': 500},
+                'clickmode': 'event+select',
+                'plot_bgcolor': '#e6ecf3'
+            }
+        }),
+    ], className="graph"),
+
     dbc.Container(children=[
         html.H3("Mutual Fund Investment Distribution"),
         dbc.Row(children=[
@@ -1,12 +1,13 @@
 import asyncio
+import hashlib
 import logging
 import pathlib
 import sys
 from datetime import datetime
+from json.decoder import JSONDecodeError
 
 import nsepy
-import requests
-import ujson as json
+import nsepy.urls
 from pandas import DataFrame
 
 sys.path.append(pathlib.Path(__file__).parent.parent.parent.absolute().as_posix())
@@ -14,10 +15,22 @@ sys.path.append(pathlib.Path(__file__).parent.parent.parent.absolute().as_posix(
 from gdrive.GDrive import (
     GDrive,
 )
-from models.day_change import (
-    InvestmentData,
-    get_investment_data
+from models.day_change import InvestmentData
+from models.nav_date import format_nav_date, keys_to_ordinals
+from util.day_change_engine import ValuationResult, compute_valuation, holding_flows
+from util.http_client import (
+    close_http_client,
+    configure_requests_session,
+    get_http_client,
+    requests_session_stats,
 )
+from util.lot_ledger import LotLedger
+from util.nav_archive import NavArchive
+from util.rolling_metrics import TRAILING_PERIODS, rebuild_metrics
+from util.scheme_index import SCHEME_INDEX_FILE_NAME, SchemeIndex, ensure_scheme_index
+from util.serializer import dump_file, load_file
+from util.storage import Storage, get_storage
+from util.write_behind import WriteBehind
 
 data_path = (
     pathlib.Path(__file__).parent.parent.parent.joinpath("data").resolve().as_posix()
@@ -54,38 +67,57 @@ sys.excepthook = log_uncaught_exceptions
 FOLDER_NAME: str = "MutualFund"  # type: ignore
 
 
+def percent_or_na(value: float | None) -> str:
+    return "N.A." if value is None else f"{value}%"
+
+
 def roundup3(value: float) -> float:
     return round(value, 3)
 
 
-async def readJsonFileAsynchronously(filename: str | pathlib.Path):
-    logging.info(f"reading asynchronously {filename=}")
+def drawdown_percent(drawdown: float) -> str:
+    drawdown = roundup3(drawdown) + 0.0  # no -0.0
+    return f"-{drawdown}%" if drawdown > 0 else f"{drawdown}%"
+
+
+async def download_from_drive(filename: str | pathlib.Path) -> None:
     async with GDrive(FOLDER_NAME) as gdrive:
         await gdrive.download_async(filename)
-    with open(filename, "r") as f:
-        return json.load(f)
+
+
+async def readJsonFileAsynchronously(filename: str | pathlib.Path):
+    logging.info(f"reading asynchronously {filename=}")
+    await download_from_drive(filename)
+    return load_file(filename)
+
+
+async def readOptionalJsonFileAsynchronously(filename: str | pathlib.Path) -> dict:
+    """
+    files the tracker builds up over time (order history, lots), missing on older setups
+    """
+    try:
+        return await readJsonFileAsynchronously(filename)
+    except (FileNotFoundError, JSONDecodeError):
+        return {}
 
 
 def readJsonFromDataFolder(filename):
     file_path = pathlib.Path(data_path).joinpath(filename).resolve()
     GDrive(FOLDER_NAME).download(file_path)
-    with open(file_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return load_file(file_path)
 
 
 async def readJsonFromDataFolderAsychronously(filename):
     file_path = pathlib.Path(data_path).joinpath(filename).resolve()
     await GDrive(FOLDER_NAME).download_async(file_path)
-    with open(file_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return load_file(file_path)
 
 
 def readJsonFile(filename: str | pathlib.Path):
     logging.info(f"reading {filename=}")
 
     GDrive(FOLDER_NAME).download(filename)
-    with open(filename, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return load_file(filename)
 
 
 def writeRawDataToFile(file_name: str, data: str) -> None:
@@ -94,30 +126,34 @@ def writeRawDataToFile(file_name: str, data: str) -> None:
         file.write(data)
 
 
-async def write_to_file_async(
-        filename: pathlib.Path, data: dict, indent=4
-) -> None:
+async def write_to_file_async(filename: pathlib.Path, data: dict) -> None:
     logging.info(f"writing asynchronously to {filename=}")
-    with open(filename, mode="w") as f:
-        # f.write(json.dumps(obj=data, indent=indent))
-        # noinspection PyTypeChecker
-        json.dump(data, f, indent=indent)
+    dump_file(filename, data)
     async with GDrive(FOLDER_NAME) as gdrive:
         await gdrive.upload_async(filename)
 
 
-def writeToFile(filename: pathlib.Path, data: object, indent=4) -> None:
+async def upload_to_drive(filename: pathlib.Path) -> None:
+    async with GDrive(FOLDER_NAME) as gdrive:
+        await gdrive.upload_async(filename)
+
+
+def writeToFile(filename: pathlib.Path, data: object) -> None:
     logging.info(f"writing to {filename=}")
-    with open(filename, "w") as f:
-        # noinspection PyTypeChecker
-        json.dump(data, f, indent=indent)
+    dump_file(filename, data)
     GDrive(FOLDER_NAME).upload(filename)
 
 
+# nsepy sends every request through its module level requests session, pool it like the aiohttp client
+configure_requests_session(nsepy.urls.session)
+
+
 def get_history(symbol: str, start: str, end: str) -> DataFrame:
     start_date = datetime.strptime(start, "%Y-%m-%d")
     end_date = datetime.strptime(end, "%Y-%m-%d")
-    return nsepy.get_history(symbol, start=start_date, end=end_date)
+    history = nsepy.get_history(symbol, start=start_date, end=end_date)
+    logging.info("stock history session: %s", requests_session_stats(nsepy.urls.session))
+    return history
 
 
 class helper_functions:
@@ -136,6 +172,7 @@ class helper_functions:
             print("Already initialized")
             return
         self.json_data = None
+        self.scheme_index: SchemeIndex | None = None
         self.mutual_funds_dic = None
         self.stock_data = None
         self.stock_order = None
@@ -144,14 +181,25 @@ class helper_functions:
         self.mutual_funds = None
         self.order = None
         self.tasks = None
+        self.storage: Storage = get_storage(
+            data_path, download_from_drive, WriteBehind(upload=upload_to_drive)
+        )
         self.unit_file_path = pathlib.Path(data_path).joinpath("units.json").resolve()
         self.daychange_file_path = (
             pathlib.Path(data_path).joinpath("dayChange.json").resolve()
         )
         self.order_file_path = pathlib.Path(data_path).joinpath("order.json").resolve()
-        self.json_data_file_path = (
-            pathlib.Path(data_path).joinpath("NAVAll.json").resolve()
+        self.order_history_file_path = (
+            pathlib.Path(data_path).joinpath("order_history.json").resolve()
+        )
+        self.lots_file_path = pathlib.Path(data_path).joinpath("lots.json").resolve()
+        self.order_history: dict[str, dict[int, list]] = {}
+        self.ledger = LotLedger()
+        self.valuation: ValuationResult | None = None
+        self.scheme_index_file_path = (
+            pathlib.Path(data_path).joinpath(SCHEME_INDEX_FILE_NAME).resolve()
         )
+        self.nav_archive = NavArchive(pathlib.Path(data_path).joinpath("nav_archive"))
         self.stock_data_file_path = (
             pathlib.Path(data_path).joinpath("stocks_data.json").resolve()
         )
@@ -170,33 +218,34 @@ class helper_functions:
 
     async def load_on(self):
         file_list = [
-            self.daychange_file_path,
-            self.unit_file_path,
-            self.order_file_path,
             self.stock_order_file_path,
             self.stock_data_file_path,
         ]
         self.tasks = [
+            asyncio.create_task(self.storage.load_investment_data(), name=self.daychange_file_path.as_posix()),
+            asyncio.create_task(self.storage.load_units(), name=self.unit_file_path.as_posix()),
+            asyncio.create_task(self.storage.load_orders(), name=self.order_file_path.as_posix()),
+        ]
+        self.tasks += [
             asyncio.create_task(
                 readJsonFileAsynchronously(file), name=file.as_posix()
             )
             for file in file_list
         ]
-        self.tasks.append(
+
+        self.tasks += [
             asyncio.create_task(
-                asyncio.to_thread(self.create_index_all_mutual_fund),
-                name="create_index_all_mutual_fund",
+                readOptionalJsonFileAsynchronously(file), name=file.as_posix()
             )
-        )
+            for file in (self.order_history_file_path, self.lots_file_path)
+        ]
 
         results, _ = await asyncio.wait(self.tasks)
 
         for result in results:
             print(result.get_name())
-            if result.get_name() == "create_index_all_mutual_fund":
-                continue
-            elif result.get_name() == self.daychange_file_path.as_posix():
-                self.daychange_json = get_investment_data(result.result())
+            if result.get_name() == self.daychange_file_path.as_posix():
+                self.daychange_json = result.result()
             elif result.get_name() == self.unit_file_path.as_posix():
                 self.unit_json = result.result()
 
@@ -206,8 +255,21 @@ class helper_functions:
                 self.stock_order = result.result()
             elif result.get_name() == self.stock_data_file_path.as_posix():
                 self.stock_data = result.result()
+            elif result.get_name() == self.order_history_file_path.as_posix():
+                self.order_history = {
+                    mfid: keys_to_ordinals(orders) for mfid, orders in result.result().items()
+                }
+            elif result.get_name() == self.lots_file_path.as_posix():
+                self.ledger = LotLedger.from_json(result.result())
 
         self.tasks.clear()
+        self.scheme_index = await ensure_scheme_index(
+            self.scheme_index_file_path, self.nav_archive, self.daychange_json.hash
+        )
+        if self.scheme_index is None:
+            await self.create_index_all_mutual_fund()
+        await close_http_client()
+        self.json_data = self.scheme_index.name_to_code()
         self.mutual_funds_dic = {
             self.daychange_json.funds[unit].name: unit for unit in self.unit_json
         }
@@ -246,72 +308,60 @@ class helper_functions:
             self.order[MFID] = {date: [unit, amount]}
             value = "new"
 
-        writeToFile(self.order_file_path, self.order)
+        self.storage.save_orders(self.order)
+        asyncio.run(self.storage.flush())
         return value
 
-    def getDailyChange(self):
-        sumDayChange: dict = {}
-        units_json = self.unit_json
-        daychange_json = self.daychange_json
+    def get_valuation(self) -> ValuationResult:
+        """
+        units held by every fund on every NAV date, rebuilt from the settled order history
+        """
+        if self.valuation is None:
+            units_json = self.unit_json
+            funds = self.daychange_json.funds
+            self.valuation = compute_valuation(
+                {val: funds[val].nav for val in units_json},
+                {
+                    val: holding_flows(
+                        self.order_history.get(val, {}),
+                        units_json[val][0],
+                        units_json[val][1],
+                        self.ledger.realized_cost(val),
+                        funds[val].nav.dates[0] if funds[val].nav else 0,
+                    )
+                    for val in units_json
+                },
+            )
+        return self.valuation
 
-        for val in units_json.keys():
-            value: dict[str, float] = daychange_json.funds[val].nav
-            units: float = units_json[val][0]
-            i = True
-            prevDayChange = 0.0
-            for nav, daychange in value.items():
-                if i:
-                    prevDayChange = units * daychange
-                    i = False
-                    continue
-                daychange *= units
-                daychangeData: float = round(daychange - prevDayChange, 3)
-
-                if nav in sumDayChange:
-                    sumDayChange[nav] += daychangeData
-                else:
-                    sumDayChange[nav] = daychangeData
-                prevDayChange = daychange
-        sum_daychange_sorted_keys = sorted(
-            sumDayChange.keys(), key=lambda x: datetime.strptime(x, "%d-%b-%Y")
-        )
-        # sorted by key, return a dict
-        sumDayChange = {k: sumDayChange[k] for k in sum_daychange_sorted_keys}
+    def getDailyChange(self):
+        sumDayChange = self.get_valuation().total_series()
         return [
             {
-                "x": list(sumDayChange.keys()),
+                "x": [format_nav_date(date) for date in sumDayChange],
                 "y": list(sumDayChange.values()),
                 "type": "line",
                 "name": "Daily Change",
             }
         ]
 
-    def dailyChangePerMutualFund(self, id_):
+    def getPortfolioValue(self):
+        valuation = self.get_valuation()
+        x = [format_nav_date(date) for date in valuation.dates.tolist()]
+        value, invested, pnl = valuation.portfolio_series()
+        return [
+            {"x": x, "y": value, "type": "line", "name": "Value"},
+            {"x": x, "y": invested, "type": "line", "name": "Invested"},
+            {"x": x, "y": pnl, "type": "line", "name": "P&L"},
+        ]
 
-        sumDayChange: dict = {}
-        units_json = self.unit_json
+    def dailyChangePerMutualFund(self, id_):
         daychange_json = self.daychange_json
 
-        units: float = units_json[id_][0]
-        value = daychange_json.funds[id_]["nav"]
-        i = True
-        prevDayChange = 0.0
-        for nav, daychange in value.items():
-            if i:
-                prevDayChange = units * daychange
-                i = False
-                continue
-            daychange *= units
-            daychangeData: float = round(daychange - prevDayChange, 3)
-
-            if nav in sumDayChange:
-                sumDayChange[nav] += daychangeData
-            else:
-                sumDayChange[nav] = daychangeData
-            prevDayChange = daychange
+        sumDayChange = self.get_valuation().fund_series(id_)
         return [
             {
-                "x": list(sumDayChange.keys()),
+                "x": [format_nav_date(date) for date in sumDayChange],
                 "y": list(sumDayChange.values()),
                 "type": "line",
                 "name": daychange_json.funds[id_]["name"] + " Daily Change",
@@ -322,8 +372,9 @@ class helper_functions:
         daychange_json = self.daychange_json
 
         data = daychange_json.funds[value]["nav"]
-        x = list(data.keys())
-        y = list(data.values())
+        dates, navs = data.as_numpy()
+        x = [format_nav_date(date) for date in dates.tolist()]
+        y = navs
         return_list = [
             {
                 "x": x,
@@ -362,16 +413,17 @@ class helper_functions:
         totalProfitPercentage = daychange_json["totalProfitPercentage"]
         totalProfit = daychange_json["totalProfit"]
         summaryTable = [
-            ["Invested", "Current", "•Total Returns", "Last UpDated"],
+            ["Invested", "Current", "•Total Returns", "Last UpDated", "XIRR"],
             [
                 invested,
                 current,
                 f"{str(totalProfit)} {str(totalProfitPercentage)}",
                 lastUpdated,
+                percent_or_na(daychange_json.totalXirr),
             ],
         ]
         mutual_fund_table: list[list] = [
-            "SCHEME NAME,DAY CHANGE,RETURNS,CURRENT,NAV".split(",")
+            "SCHEME NAME,DAY CHANGE,RETURNS,CURRENT,NAV,XIRR".split(",")
         ]
 
         for val in units_json.keys():
@@ -391,40 +443,54 @@ class helper_functions:
             returnsPercentage = roundup3(returns / invested * 100)
             returnsString = f"{returns} {returnsPercentage}%"
             currentString = f"{current} {invested}"
-            nav_date = f'{date} {preMF["nav"][date]}'
+            nav_date = f'{format_nav_date(date)} {preMF["nav"][date]}'
+            xirr_string = f"{percent_or_na(preMF.xirr)} {percent_or_na(preMF.cagr)}"
             mutual_fund_table.append(
-                [SchemeName, daychange_string, returnsString, currentString, nav_date]
+                [SchemeName, daychange_string, returnsString, currentString, nav_date, xirr_string]
             )
 
         return summaryTable, mutual_fund_table
 
-    def create_index_all_mutual_fund(self):
-        index_all_mutual_fund = {}
-        with requests.get("https://www.amfiindia.com/spages/NAVopen.txt") as response:
-            for line in response.text.splitlines():
-                if line == "":
-                    continue
-                if line[0].isdigit():
-                    data = line.split(";")
-                    try:
-                        index_all_mutual_fund[data[3]] = data[0]
-                    except IndexError:
-                        continue
-        self.json_data: dict = index_all_mutual_fund
-        # writeToFile(self.json_data_file_path, index_all_mutual_fund) # no point of writing it to the gdrive
-        # self.tasks_no_want_to_wait_till_finish.append(self.loop.create_task(self.writeToFileAsync(
-        #     self.json_data_file_path , index_all_mutual_fund
-        #         )))
+    def getMetricsTableData(self):
+        daychange_json = self.daychange_json
+        metrics_table: list[list] = [
+            ["SCHEME NAME", *TRAILING_PERIODS, "MAX DRAWDOWN", "VOLATILITY", "SHARPE"]
+        ]
+        for val in self.unit_json.keys():
+            fund = daychange_json.funds[val]
+            if fund.metrics.lastDate != fund.latestNavDate:
+                # written by a tracker version without metrics, only until its next update
+                fund.metrics = rebuild_metrics(fund.nav)
+            metrics = fund.metrics
+            metrics_table.append(
+                [
+                    fund.name,
+                    *(percent_or_na(metrics.trailingReturns.get(period)) for period in TRAILING_PERIODS),
+                    drawdown_percent(metrics.maxDrawdown),
+                    percent_or_na(metrics.volatility),
+                    "N.A." if metrics.sharpe is None else metrics.sharpe,
+                ]
+            )
+        return metrics_table
+
+    async def create_index_all_mutual_fund(self):
+        """
+        fallback for a fresh setup without a persisted index or an archived snapshot
+        """
+        content = await get_http_client().get_bytes("https://www.amfiindia.com/spages/NAVopen.txt")
+        snapshot_hash = hashlib.md5(content).hexdigest()
+        self.scheme_index = SchemeIndex.from_lines(
+            content.decode("utf-8", errors="replace").splitlines(), snapshot_hash
+        )
+        self.scheme_index.save(self.scheme_index_file_path)
+        self.json_data: dict = self.scheme_index.name_to_code()
         return self.json_data
 
     def get_index_all_mutual_fund(self):
         return [{"label": x, "value": y} for x, y in self.json_data.items()]
 
     def get_id_name_dic(self, value):
-        json_data = self.json_data
-        value = str(value)
-        key = [k for k, v in json_data.items() if value == v]
-        return key[0]
+        return self.scheme_index.name_of(str(value))
 
     def get_all_stocks_list(self):
         stock_data = self.stock_data
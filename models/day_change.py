@@ -1,15 +1,24 @@
-from dataclasses import dataclass, field
-from typing import Any, Dict
+from collections.abc import Mapping
+from dataclasses import asdict, dataclass, field, fields
+from typing import Any, Dict, Optional
+
+from models.fund_metrics import FundMetrics
+from models.nav_date import to_ordinal
+from models.nav_series import NavSeries
 
 
 @dataclass
 class NavData:
     name: str = ""
-    nav: dict[str, float] = field(default_factory=dict)
-    latestNavDate: str = ""
+    nav: NavSeries = field(default_factory=NavSeries)
+    latestNavDate: int = 0
     current: float = 0
     invested: float = 0
     dayChange: float = 0
+    fingerprint: str = ""
+    xirr: Optional[float] = None
+    cagr: Optional[float] = None
+    metrics: FundMetrics = field(default_factory=FundMetrics)
 
     def __getitem__(self, item):
         return getattr(self, item)
@@ -26,8 +35,12 @@ class InvestmentData:
     totalDaychange: float = 0
     totalInvested: float = 0
     totalProfit: float = 0
+    totalXirr: Optional[float] = None
     hash: str = ""
     hash2: str = ""
+    etag: str = ""
+    lastModified: str = ""
+    validatorSource: str = ""
     funds: dict[str, NavData] = field(default_factory=dict)
 
     def __getitem__(self, key: str) -> Any:
@@ -37,10 +50,74 @@ class InvestmentData:
         setattr(self, key, value)
 
 
+def get_nav_data(fund_data: Dict[str, Any]) -> NavData:
+    """
+    NAV dates are stored as day ordinals in a sorted NavSeries, files still holding a
+    {"%d-%b-%Y": nav} mapping are migrated (and sorted) on load
+    """
+    fund = NavData(**fund_data)
+    if not isinstance(fund.nav, NavSeries):
+        fund.nav = NavSeries.from_json(fund.nav)
+    fund.latestNavDate = to_ordinal(fund.latestNavDate)
+    if isinstance(fund.metrics, dict):
+        fund.metrics = FundMetrics(**fund.metrics)
+    return fund
+
+
 def get_investment_data(data: Dict[str, Any]) -> InvestmentData:
     funds: Dict[str, Dict[str, Any]] = data.pop("funds") if "funds" in data else {}
     return InvestmentData(
         **data,
-        funds={fund_id: NavData(**fund_data)
+        funds={fund_id: get_nav_data(fund_data)
                for fund_id, fund_data in funds.items()}
     )
+
+
+def nav_data_to_dict(fund: NavData, with_nav: bool = True) -> Dict[str, Any]:
+    """
+    without with_nav the history is left out, for storage that keeps the NAVs as rows of their own
+    """
+    data = {f.name: getattr(fund, f.name) for f in fields(fund)}
+    if with_nav:
+        data["nav"] = fund.nav.to_json()
+    else:
+        del data["nav"]
+    data["metrics"] = asdict(fund.metrics)
+    return data
+
+
+def investment_data_to_dict(investment_data: InvestmentData, with_funds: bool = True) -> Dict[str, Any]:
+    """
+    replaces asdict(), which can't serialize the NAV arrays and deep copies every history.
+    without with_funds only the portfolio level fields
+    """
+    data = {f.name: getattr(investment_data, f.name) for f in fields(investment_data)}
+    if not with_funds:
+        del data["funds"]
+        return data
+    data["funds"] = {
+        fund_id: nav_data_to_dict(fund) for fund_id, fund in investment_data.funds.items()
+    }
+    return data
+
+
+def decode_hook(type_: type, obj: Any) -> Any:
+    """
+    typed decoding (msgspec) of the types it doesn't know, a NAV history arrives as its
+    {"dates": [...], "navs": [...]} (or legacy date mapping) object
+    """
+    if type_ is NavSeries:
+        return NavSeries.from_json(obj)
+    raise NotImplementedError(f"can't decode {type_}")
+
+
+def encode_hook(obj: Any) -> Any:
+    """
+    typed encoding of the types it doesn't know: NAV histories and fund mappings that aren't dicts
+    (a snapshot backed InvestmentData.funds)
+    """
+    if isinstance(obj, NavSeries):
+        return obj.to_json()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise NotImplementedError(f"can't encode {type(obj)}")
@@ -0,0 +1,26 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+@dataclass
+class FundMetrics:
+    """
+    rolling performance of one fund plus the running aggregates they are updated from,
+    so a new NAV is folded in without going over the history again
+    """
+    lastDate: int = 0  # day ordinal of the last NAV folded in
+    lastNav: float = 0
+    count: int = 0  # daily log returns seen
+    meanReturn: float = 0
+    m2: float = 0  # sum of squared deviations of the daily log returns (welford)
+    peakNav: float = 0
+    maxDrawdown: float = 0  # percent below the running peak
+    trailingReturns: dict[str, Optional[float]] = field(default_factory=dict)  # percent, annualized beyond 1Y
+    volatility: Optional[float] = None  # annualized, percent
+    sharpe: Optional[float] = None
+
+    def __getitem__(self, item):
+        return getattr(self, item)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
@@ -0,0 +1,55 @@
+from datetime import date
+from functools import lru_cache
+from typing import Mapping, TypeVar
+
+NAV_DATE_FORMAT = "%d-%b-%Y"
+MONTHS = {
+    month: index
+    for index, month in enumerate(
+        ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], start=1
+    )
+}
+
+T = TypeVar("T")
+
+
+def parse_nav_date(value: str) -> int:
+    """
+    "17-Oct-2026" -> proleptic gregorian day ordinal, NAV dates are kept as these ints internally
+    and only parsed once where they enter the program (feed, files, cli)
+    """
+    day, month, year = value.strip().split("-")
+    try:
+        month_number = MONTHS[month[:1].upper() + month[1:3].lower()]
+    except KeyError:
+        raise ValueError(f"invalid NAV date {value!r}") from None
+    return date(int(year), month_number, int(day)).toordinal()
+
+
+@lru_cache(maxsize=4096)
+def format_nav_date(ordinal: int) -> str:
+    """
+    day ordinal -> "17-Oct-2026", only meant for rendering and for the human owned files
+    """
+    return date.fromordinal(ordinal).strftime(NAV_DATE_FORMAT)
+
+
+def to_ordinal(value: str | int) -> int:
+    """
+    accepts the stored representations: an ordinal, an ordinal written as a json key or a legacy date string
+    """
+    if isinstance(value, int):
+        return value
+    if not value:
+        return 0
+    if value.isdigit():
+        return int(value)
+    return parse_nav_date(value)
+
+
+def keys_to_ordinals(data: Mapping[str | int, T]) -> dict[int, T]:
+    return {to_ordinal(key): value for key, value in data.items()}
+
+
+def keys_to_dates(data: Mapping[int, T]) -> dict[str, T]:
+    return {format_nav_date(key): value for key, value in data.items()}
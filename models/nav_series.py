@@ -0,0 +1,118 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterable, Iterator, Mapping, Optional
+
+import numpy as np
+
+from models.nav_date import to_ordinal
+
+
+class NavSeries:
+    """
+    NAV history of one fund kept sorted by date in two typed arrays,
+    dates as int32 day ordinals and NAVs as float64.
+
+    lookups are binary searches, a new latest day is an O(1) append, and the arrays can be
+    handed to numpy / plotting without copying (see as_numpy). while such a view is alive the
+    arrays cannot grow, so views are for read only paths.
+    """
+
+    __slots__ = ("dates", "navs")
+
+    def __init__(self, dates: Iterable[int] = (), navs: Iterable[float] = ()):
+        self.dates = array("i", dates)
+        self.navs = array("d", navs)
+        if len(self.dates) != len(self.navs):
+            raise ValueError("dates and navs must have the same length")
+
+    @classmethod
+    def from_mapping(cls, data: Mapping[int, float]) -> "NavSeries":
+        ordered = sorted(data.items())
+        return cls((date for date, _ in ordered), (nav for _, nav in ordered))
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.dates)
+
+    def __repr__(self) -> str:
+        return f"NavSeries({len(self)} dates)"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, NavSeries) and self.dates == other.dates and self.navs == other.navs
+
+    def _index(self, date: int) -> int:
+        index = bisect_left(self.dates, date)
+        if index < len(self.dates) and self.dates[index] == date:
+            return index
+        return -1
+
+    def __contains__(self, date: int) -> bool:
+        return self._index(date) != -1
+
+    def __getitem__(self, date: int) -> float:
+        index = self._index(date)
+        if index == -1:
+            raise KeyError(date)
+        return self.navs[index]
+
+    def get(self, date: int, default: Optional[float] = None) -> Optional[float]:
+        index = self._index(date)
+        return default if index == -1 else self.navs[index]
+
+    def __setitem__(self, date: int, nav: float) -> None:
+        if not self.dates or date > self.dates[-1]:
+            self.dates.append(date)
+            self.navs.append(nav)
+            return
+        index = bisect_left(self.dates, date)
+        if self.dates[index] == date:
+            self.navs[index] = nav
+        else:
+            self.dates.insert(index, date)
+            self.navs.insert(index, nav)
+
+    def keys(self) -> array:
+        return self.dates
+
+    def values(self) -> array:
+        return self.navs
+
+    def items(self) -> Iterator[tuple[int, float]]:
+        return zip(self.dates, self.navs)
+
+    def latest(self) -> Optional[tuple[int, float]]:
+        return (self.dates[-1], self.navs[-1]) if self.dates else None
+
+    def on_or_before(self, date: int) -> Optional[tuple[int, float]]:
+        """
+        the NAV in force on date, i.e. the last one published on or before it
+        """
+        index = bisect_right(self.dates, date) - 1
+        return None if index < 0 else (self.dates[index], self.navs[index])
+
+    def before(self, date: int) -> Optional[tuple[int, float]]:
+        index = bisect_left(self.dates, date) - 1
+        return None if index < 0 else (self.dates[index], self.navs[index])
+
+    def as_numpy(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+        zero copy int32 / float64 views over the arrays
+        """
+        return (
+            np.frombuffer(self.dates, dtype=np.int32) if self.dates else np.empty(0, dtype=np.int32),
+            np.frombuffer(self.navs, dtype=np.float64) if self.navs else np.empty(0, dtype=np.float64),
+        )
+
+    def to_json(self) -> dict[str, list]:
+        return {"dates": self.dates.tolist(), "navs": self.navs.tolist()}
+
+    @classmethod
+    def from_json(cls, data: Mapping) -> "NavSeries":
+        """
+        current {"dates": [...], "navs": [...]} layout, or a legacy {date: nav} mapping (sorted here)
+        """
+        if "dates" in data and "navs" in data:
+            return cls(data["dates"], data["navs"])
+        return cls.from_mapping({to_ordinal(date): nav for date, nav in data.items()})
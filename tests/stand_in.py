@@ -0,0 +1,59 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import AsyncIterator
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from util.nav_providers import NAV_HEADER
+
+
+def feed_body(navs: dict[str, float], date: datetime) -> bytes:
+    """
+    a navopen.txt shaped body with one row per scheme code, all on date
+    """
+    lines = [";".join(NAV_HEADER), "", "Open Ended Schemes(Equity Scheme - Large Cap Fund)", ""]
+    lines += [
+        f"{code};INF{code}01;INF{code}02;Scheme {code} - Direct Plan - Growth;{nav};{date:%d-%b-%Y}"
+        for code, nav in navs.items()
+    ]
+    return ("\r\n".join(lines + ["", ""])).encode()
+
+
+class StandInFeed:
+    """
+    a local stand-in for an AMFI endpoint: serves body after delay seconds, answers 304 to a
+    matching If-None-Match and records the headers of every request
+    """
+
+    def __init__(self, body: bytes, etag: str = "", delay: float = 0, status: int = 200):
+        self.body = body
+        self.etag = etag
+        self.delay = delay
+        self.status = status
+        self.requests: list[dict[str, str]] = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append(dict(request.headers))
+        await asyncio.sleep(self.delay)
+        if self.etag and request.headers.get("If-None-Match") == self.etag:
+            return web.Response(status=304)
+        headers = {"ETag": self.etag} if self.etag else {}
+        return web.Response(body=self.body, status=self.status, headers=headers)
+
+
+@asynccontextmanager
+async def serve(*feeds: StandInFeed) -> AsyncIterator[list[str]]:
+    """
+    one local server for all the feeds, yields the url of each
+    """
+    app = web.Application()
+    for index, feed in enumerate(feeds):
+        app.router.add_get(f"/{index}/navopen.txt", feed.handle)
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        yield [str(server.make_url(f"/{index}/navopen.txt")) for index in range(len(feeds))]
+    finally:
+        await server.close()
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from models.nav_series import NavSeries
+from util.analytics import batched_xirr, compute_returns, nav_cagr, pack_cash_flows
+
+DAY = 738000
+
+
+def test_flows_on_one_day_have_no_xirr():
+    rates = batched_xirr(*pack_cash_flows([[(DAY, -100.0), (DAY, 100.0)], [(DAY, -100.0), (DAY, 105.0)]]))
+    assert np.isnan(rates).all()
+
+
+def test_xirr_of_a_year():
+    rates = batched_xirr(*pack_cash_flows([[(DAY, -100.0), (DAY + 365, 110.0)]]))
+    assert rates[0] == pytest.approx(0.1)
+
+
+def test_short_spans_get_the_absolute_return():
+    nav = NavSeries([DAY, DAY + 3], [10.0, 11.0])
+    result = compute_returns({"100001": [(DAY, -100.0)]}, {"100001": (DAY + 3, 110.0)}, {"100001": nav})
+    assert result.xirr == {"100001": 10.0}
+    assert result.total_xirr == 10.0
+    assert result.cagr == {"100001": 10.0}
+
+
+def test_first_update_has_no_rate_beyond_the_absolute_return():
+    nav = NavSeries([DAY], [10.0])
+    result = compute_returns({"100001": [(DAY, -100.0)]}, {"100001": (DAY, 100.0)}, {"100001": nav})
+    assert result.xirr == {"100001": 0.0}
+    assert result.cagr == {"100001": None}
+
+
+def test_cagr_is_annualized_over_a_year_or_more():
+    nav = NavSeries([DAY, DAY + 730], [10.0, 12.1])
+    assert nav_cagr(nav, DAY, DAY + 730) == pytest.approx(0.1)
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from MutualFundTracker import MutualFund
+from models.day_change import InvestmentData, NavData
+from models.nav_series import NavSeries
+from util.datasets import ALL_DATASETS, NoFundsTracked
+from util.serializer import dump_file
+from util.storage import JsonStorage
+
+
+async def no_download(path) -> None:
+    pass
+
+
+def make_tracker(tmp_path) -> MutualFund:
+    data = InvestmentData(sumTotal=110, totalInvested=100, etag='"v1"', validatorSource="navopen", hash="h1")
+    data.funds["100001"] = NavData(name="fund", nav=NavSeries([738000], [11.0]), current=110, invested=100)
+    dump_file(tmp_path / "units.json", {"100001": [10, 100]})
+    dump_file(tmp_path / "order.json", {"100001": {"07-May-2022": [1, 10]}})
+    dump_file(tmp_path / "dayChange.json", data)
+    dump_file(tmp_path / "order_history.json", {})
+    dump_file(tmp_path / "lots.json", {})
+    tracker = MutualFund(is_downloadable=False, datasets=())
+    tracker.storage = JsonStorage(tmp_path, no_download, tracker.writes)
+    tracker.order_history_file = tmp_path / "order_history.json"
+    tracker.lots_file = tmp_path / "lots.json"
+    return tracker
+
+
+def test_failed_poll_state_is_reloaded_and_downloaded_again(tmp_path):
+    tracker = make_tracker(tmp_path)
+
+    async def scenario():
+        await tracker.load(*ALL_DATASETS)
+        # a poll that got this far and then failed
+        tracker.json_data.etag, tracker.json_data.hash = '"v2"', "h2"
+        tracker.json_data.funds["100001"].nav[738001] = 12.0
+        tracker.json_data.sumTotal = 120
+        tracker.Orders.pop_all("100001")
+        tracker.write_day_change_file()
+
+        await tracker.recover_from_failed_poll()
+
+    asyncio.run(scenario())
+    assert not tracker.writes.pending
+    assert tracker.json_data.sumTotal == 110
+    assert list(tracker.json_data.funds["100001"].nav.dates) == [738000]
+    assert tracker.Orders.to_json() == {"100001": {"07-May-2022": [1, 10]}}
+    assert (tracker.json_data.etag, tracker.json_data.validatorSource, tracker.json_data.hash) == ("", "", "")
+
+
+def test_empty_units_raise_without_cancelling_the_other_loaders(tmp_path):
+    tracker = make_tracker(tmp_path)
+    dump_file(tmp_path / "units.json", {})
+
+    with pytest.raises(NoFundsTracked):
+        asyncio.run(tracker.load(*ALL_DATASETS))
+    assert tracker.json_data.sumTotal == 110
+    assert tracker.Orders.to_json() == {"100001": {"07-May-2022": [1, 10]}}
@@ -0,0 +1,28 @@
+from rich.console import Console
+
+from MutualFundTracker import MutualFund, getfd
+from models.day_change import InvestmentData, NavData
+from models.nav_series import NavSeries
+
+DAY = 738000
+
+
+def test_rising_fund_has_no_negative_zero_drawdown():
+    assert getfd(-0.0) == getfd(1e-9) == "0.0%"
+    assert getfd(12.3456) == "[red]-12.346%[/red]"
+
+
+def test_scheme_name_keeps_its_width_in_80_columns():
+    tracker = MutualFund(is_downloadable=False, datasets=())
+    tracker.units = {"100001": [10, 100]}
+    tracker.json_data = InvestmentData()
+    tracker.json_data.funds["100001"] = NavData(
+        name="Flexi Cap Fund Growth", nav=NavSeries([DAY, DAY + 1, DAY + 2], [10.0, 10.5, 11.0]),
+        latestNavDate=DAY + 2,
+    )
+    tracker.console = Console(width=80, record=True)
+    tracker.metrics_table()
+
+    text = tracker.console.export_text()
+    assert "Flexi Cap" in text
+    assert "-0.0%" not in text
@@ -0,0 +1,92 @@
+import asyncio
+import hashlib
+import os
+import time
+from datetime import datetime
+
+from tests.stand_in import feed_body
+from util.nav_archive import STALE_PART_SECONDS, NavArchive
+
+FEED = feed_body({"100001": 10.5, "100002": 20.5}, datetime(2026, 10, 16))
+DAY = 86400
+
+
+def archive_feed(archive: NavArchive, body: bytes) -> str:
+    async def chunks():
+        yield body
+
+    async def scenario() -> str:
+        writer = archive.writer()
+        md5 = hashlib.md5()
+        async for chunk in writer.tee(chunks()):
+            md5.update(chunk)
+        writer.commit(md5.hexdigest())
+        return md5.hexdigest()
+
+    return asyncio.run(scenario())
+
+
+def age(archive: NavArchive, content_hash: str, days: float) -> None:
+    then = time.time() - days * DAY
+    os.utime(archive.path_for(content_hash), (then, then))
+
+
+def test_same_content_is_stored_once(tmp_path):
+    archive = NavArchive(tmp_path)
+    first = archive_feed(archive, FEED)
+    age(archive, first, 2)
+
+    assert archive_feed(archive, FEED) == first
+    assert [entry[0] for entry in archive.snapshots()] == [first]
+    assert archive.snapshots()[0][1] > time.time() - DAY  # its age was refreshed
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_old_snapshots_are_evicted(tmp_path):
+    archive = NavArchive(tmp_path, max_age_days=30)
+    old, new = archive_feed(archive, FEED), archive_feed(archive, FEED + b"\r\n")
+    age(archive, old, 31)
+
+    assert archive.evict() == [old]
+    assert old not in archive and new in archive
+
+
+def test_oldest_snapshots_are_evicted_down_to_the_size_limit(tmp_path):
+    archive = NavArchive(tmp_path, max_bytes=10**9, max_age_days=None)
+    hashes = [archive_feed(archive, FEED + b"\r\n" * count) for count in range(3)]
+    for days, content_hash in zip((3, 2, 1), hashes):
+        age(archive, content_hash, days)
+    archive.max_bytes = sum(entry[2] for entry in archive.snapshots()[:2])
+
+    assert archive.evict() == [hashes[0]]
+    assert archive.latest() == hashes[2]
+
+
+def test_abandoned_part_files_are_removed(tmp_path):
+    archive = NavArchive(tmp_path)
+    abandoned, in_progress = tmp_path / "dead.part", tmp_path / "live.part"
+    abandoned.write_bytes(b"partial")
+    in_progress.write_bytes(b"partial")
+    then = time.time() - STALE_PART_SECONDS - 60
+    os.utime(abandoned, (then, then))
+
+    archive.evict()
+    assert not abandoned.exists()
+    assert in_progress.exists()
+
+
+def test_aborted_write_leaves_nothing(tmp_path):
+    archive = NavArchive(tmp_path)
+    archive.writer().abort()
+    assert not list(tmp_path.iterdir())
+
+
+def test_replay_parses_the_archived_feed(tmp_path):
+    archive = NavArchive(tmp_path)
+    content_hash = archive_feed(archive, FEED)
+
+    async def replay():
+        return [record async for record in archive.parse(content_hash, {"100002"})]
+
+    records = asyncio.run(replay())
+    assert [(record.scheme_code, record.nav) for record in records] == [("100002", 20.5)]
@@ -0,0 +1,27 @@
+from models.day_change import InvestmentData, NavData
+from models.nav_series import NavSeries
+from util.nav_backfill import backfill_nav_history
+
+HISTORY = """Scheme Code;Scheme Name;ISIN Div Payout/ISIN Growth;ISIN Div Reinvestment;Net Asset Value;Repurchase Price;Sale Price;Date
+100001;Fund One - Direct Plan - Growth;INF1;;10.5;;;02-Jan-2023
+100001;Fund One - Direct Plan - Growth;INF1;;10.0;;;01-Jan-2023
+100002;Fund Two - Direct Plan - Growth;INF2;;20.0;;;01-Jan-2023
+"""
+
+
+def test_backfill_merges_into_the_tracked_funds(tmp_path):
+    (tmp_path / "history.txt").write_text(HISTORY)
+    data = InvestmentData()
+    data.funds["100001"] = NavData(name="Fund One", nav=NavSeries([738523], [10.75]), invested=100)
+
+    added = backfill_nav_history(data, [tmp_path / "history.txt"], {"100001", "100002"})
+    assert added == {"100001": 2}
+    assert list(data.funds["100001"].nav.navs) == [10.0, 10.5, 10.75]
+
+
+def test_funds_without_an_entry_are_not_created(tmp_path):
+    (tmp_path / "history.txt").write_text(HISTORY)
+    data = InvestmentData()
+
+    assert backfill_nav_history(data, [tmp_path / "history.txt"], {"100002"}) == {}
+    assert "100002" not in data.funds
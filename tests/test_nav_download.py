@@ -0,0 +1,91 @@
+import asyncio
+from datetime import datetime
+
+from MutualFundTracker import INDIAN_TIMEZONE, MutualFund
+from models.day_change import InvestmentData
+from tests.stand_in import StandInFeed, feed_body, serve
+from util.http_client import close_http_client
+from util.nav_archive import NavArchive
+from util.nav_providers import HttpNavProvider
+
+TODAY = datetime.now(INDIAN_TIMEZONE).replace(tzinfo=None)
+
+
+def make_tracker(tmp_path, url: str) -> tuple[MutualFund, list]:
+    tracker = MutualFund(is_downloadable=True, datasets=())
+    tracker.units = {"100001": [10, 1000]}
+    tracker.json_data = InvestmentData()
+    tracker.nav_providers = [HttpNavProvider("stand-in", url)]
+    tracker.nav_archive = NavArchive(tmp_path / "nav_archive")
+    tracker.schemeIndexFile = tmp_path / "scheme_index"
+    saved = []
+    tracker.write_day_change_file = lambda: saved.append(tracker.json_data.etag)
+    return tracker, saved
+
+
+def run(scenario):
+    async def wrapped():
+        try:
+            await scenario()
+        finally:
+            await close_http_client()
+
+    asyncio.run(wrapped())
+
+
+def test_download_keeps_only_tracked_rows_and_saves_validators(tmp_path):
+    feed = StandInFeed(feed_body({"100001": 10.5, "100002": 20.5}, TODAY), etag='"v1"')
+
+    async def scenario():
+        async with serve(feed) as (url,):
+            tracker, saved = make_tracker(tmp_path, url)
+            assert await tracker.download_all_nav_file()
+            assert [record.scheme_code for record in tracker.nav_my_records] == ["100001"]
+            assert tracker.nav_my_records[0].nav == 10.5
+            assert (tracker.json_data.etag, tracker.json_data.validatorSource) == ('"v1"', "stand-in")
+            assert saved
+
+    run(scenario)
+
+
+def test_unchanged_feed_is_answered_not_modified(tmp_path):
+    feed = StandInFeed(feed_body({"100001": 10.5}, TODAY), etag='"v1"')
+
+    async def scenario():
+        async with serve(feed) as (url,):
+            tracker, _ = make_tracker(tmp_path, url)
+            assert await tracker.download_all_nav_file()
+            assert not await tracker.download_all_nav_file()
+            assert feed.requests[-1].get("If-None-Match") == '"v1"'
+
+    run(scenario)
+
+
+def test_new_validators_are_saved_when_the_content_is_unchanged(tmp_path):
+    feed = StandInFeed(feed_body({"100001": 10.5}, TODAY), etag='"v1"')
+
+    async def scenario():
+        async with serve(feed) as (url,):
+            tracker, saved = make_tracker(tmp_path, url)
+            assert await tracker.download_all_nav_file()
+            saved.clear()
+            feed.etag = '"v2"'
+            assert not await tracker.download_all_nav_file()
+            assert saved == ['"v2"']
+
+    run(scenario)
+
+
+def test_same_content_from_another_provider_keeps_the_validators(tmp_path):
+    body = feed_body({"100001": 10.5}, TODAY)
+    navopen, nav_all = StandInFeed(body, etag='"a1"'), StandInFeed(body, etag='"b1"')
+
+    async def scenario():
+        async with serve(navopen, nav_all) as (navopen_url, nav_all_url):
+            tracker, _ = make_tracker(tmp_path, navopen_url)
+            assert await tracker.download_all_nav_file()
+            tracker.nav_providers = [HttpNavProvider("NAVAll", nav_all_url)]
+            assert not await tracker.download_all_nav_file()
+            assert (tracker.json_data.etag, tracker.json_data.validatorSource) == ('"a1"', "stand-in")
+
+    run(scenario)
@@ -0,0 +1,40 @@
+import asyncio
+
+from util.nav_parser import filter_scheme_lines, iter_lines, parse_nav_stream, scheme_code_of
+
+LINES = [
+    "Scheme Code;ISIN Div Payout/ ISIN Growth;ISIN Div Reinvestment;Scheme Name;Net Asset Value;Date",
+    "Open Ended Schemes(Equity Scheme - Large Cap Fund)",
+    "100001;INF100001A01;-;Fund One - Direct Plan - Growth;10.5;16-Oct-2026",
+    # the tracked code inside the ISIN and the scheme name of other schemes
+    "200002;INF100001B02;INF100001B03;Fund 100001 Clone - Direct Plan;20.5;16-Oct-2026",
+    "300003;INF300003C01;-;Fund Three;100001;16-Oct-2026",
+]
+
+
+async def chunked(lines: list[str], size: int = 7):
+    body = "\r\n".join(lines).encode()
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def collect(iterator) -> list:
+    async def run():
+        return [item async for item in iterator]
+
+    return asyncio.run(run())
+
+
+def test_scheme_code_is_the_first_field():
+    assert scheme_code_of(" 100001 ;INF;x") == "100001"
+    assert scheme_code_of("Open Ended Schemes") == "Open Ended Schemes"
+
+
+def test_only_the_scheme_code_column_matches():
+    kept = collect(filter_scheme_lines(iter_lines(chunked(LINES)), {"100001"}))
+    assert kept == [LINES[2]]
+
+
+def test_stream_yields_the_tracked_records():
+    records = collect(parse_nav_stream(chunked(LINES), {"100001", "300003"}))
+    assert [(record.scheme_code, record.nav) for record in records] == [("100001", 10.5), ("300003", 100001.0)]
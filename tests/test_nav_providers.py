@@ -0,0 +1,124 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import aiohttp
+import pytest
+
+from tests.stand_in import StandInFeed, feed_body, serve
+from util.nav_providers import (
+    HttpNavProvider,
+    LocalFileNavProvider,
+    NavFeed,
+    NavProvider,
+    NavProviderError,
+    race_providers,
+)
+
+TODAY = datetime(2026, 10, 16)
+FRESH = feed_body({"100001": 10.5, "100002": 20.5}, TODAY)
+
+
+def race(feeds: list[StandInFeed], make_providers, **kwargs) -> NavFeed:
+    """
+    serve the feeds, race the providers make_providers builds from their urls and return the
+    winner with its body read into winner.body
+    """
+
+    async def scenario() -> NavFeed:
+        async with serve(*feeds) as urls, aiohttp.ClientSession() as session:
+            providers: list[NavProvider] = make_providers(urls)
+            kwargs.setdefault("today", TODAY)
+            winner = await race_providers(providers, session, lambda provider: {}, **kwargs)
+            winner.body = b"".join([chunk async for chunk in winner.chunks]) if winner.chunks else b""
+            winner.close()
+            return winner
+
+    return asyncio.run(scenario())
+
+
+def test_fastest_valid_feed_wins():
+    feeds = [StandInFeed(FRESH, delay=0.5), StandInFeed(FRESH)]
+    winner = race(feeds, lambda urls: [HttpNavProvider("slow", urls[0]), HttpNavProvider("fast", urls[1])])
+    assert winner.provider == "fast"
+    assert winner.body == FRESH
+
+
+def test_timed_out_provider_loses():
+    feeds = [StandInFeed(FRESH, delay=2), StandInFeed(FRESH, delay=0.3)]
+    winner = race(feeds, lambda urls: [
+        HttpNavProvider("hanging", urls[0], timeout=0.1), HttpNavProvider("slow", urls[1]),
+    ])
+    assert winner.provider == "slow"
+
+
+def test_all_timed_out_raises():
+    with pytest.raises(NavProviderError, match="all NAV providers failed"):
+        race([StandInFeed(FRESH, delay=2)], lambda urls: [HttpNavProvider("hanging", urls[0], timeout=0.1)])
+
+
+@pytest.mark.parametrize("body,status", [
+    (b"<html>maintenance</html>\r\n", 200),
+    (feed_body({"100001": 10.5, "100002": 20.5}, TODAY - timedelta(days=10)), 200),
+    (FRESH, 500),
+])
+def test_invalid_feed_loses_to_a_slower_valid_one(body, status):
+    feeds = [StandInFeed(body, status=status), StandInFeed(FRESH, delay=0.3)]
+    winner = race(feeds, lambda urls: [HttpNavProvider("broken", urls[0]), HttpNavProvider("valid", urls[1])])
+    assert winner.provider == "valid"
+    assert winner.body == FRESH
+
+
+def test_local_file_is_not_raced_against_the_network(tmp_path):
+    (tmp_path / "navopen.txt").write_bytes(FRESH)
+    winner = race([StandInFeed(FRESH, delay=0.3)], lambda urls: [
+        LocalFileNavProvider("local", tmp_path / "navopen.txt"), HttpNavProvider("network", urls[0]),
+    ])
+    assert winner.provider == "network"
+
+
+def test_network_not_modified_beats_local_file(tmp_path):
+    (tmp_path / "navopen.txt").write_bytes(FRESH)
+    feed = StandInFeed(FRESH, etag='"v1"')
+
+    async def scenario() -> NavFeed:
+        async with serve(feed) as (url,), aiohttp.ClientSession() as session:
+            providers = [LocalFileNavProvider("local", tmp_path / "navopen.txt"), HttpNavProvider("network", url)]
+            return await race_providers(providers, session, lambda provider: {"If-None-Match": '"v1"'}, today=TODAY)
+
+    winner = asyncio.run(scenario())
+    assert (winner.provider, winner.not_modified) == ("network", True)
+
+
+def test_local_file_is_the_fallback_when_the_network_fails(tmp_path):
+    (tmp_path / "navopen.txt").write_bytes(FRESH)
+    winner = race([StandInFeed(FRESH, status=503)], lambda urls: [
+        LocalFileNavProvider("local", tmp_path / "navopen.txt"), HttpNavProvider("network", urls[0]),
+    ], newer_than=TODAY.toordinal() - 1)
+    assert winner.provider == "local"
+    assert winner.body == FRESH
+
+
+def test_local_file_without_newer_navs_is_rejected(tmp_path):
+    (tmp_path / "navopen.txt").write_bytes(FRESH)
+    with pytest.raises(NavProviderError, match="no NAV after"):
+        race([StandInFeed(FRESH, status=503)], lambda urls: [
+            LocalFileNavProvider("local", tmp_path / "navopen.txt"), HttpNavProvider("network", urls[0]),
+        ], newer_than=TODAY.toordinal())
+
+
+def test_only_stale_feeds_are_not_modified():
+    holiday = feed_body({"100001": 10.5, "100002": 20.5}, TODAY - timedelta(days=10))
+    feeds = [StandInFeed(holiday), StandInFeed(b"<html>maintenance</html>\r\n")]
+    winner = race(feeds, lambda urls: [HttpNavProvider("navopen", urls[0]), HttpNavProvider("broken", urls[1])])
+    assert (winner.provider, winner.not_modified) == ("navopen", True)
+
+
+def test_staleness_counts_business_days():
+    # Friday's NAVs on the following Thursday, over a weekend and a two day holiday
+    friday = datetime(2026, 10, 9)
+    winner = race(
+        [StandInFeed(feed_body({"100001": 10.5, "100002": 20.5}, friday))],
+        lambda urls: [HttpNavProvider("navopen", urls[0])],
+        today=datetime(2026, 10, 15),
+    )
+    assert not winner.not_modified
@@ -0,0 +1,79 @@
+import asyncio
+
+from MutualFundTracker import MutualFund
+from models.day_change import InvestmentData, NavData
+from models.nav_series import NavSeries
+from util.day_change_engine import compute_valuation
+from util.lot_ledger import LotLedger
+from util.order_book import OrderBook
+
+DAY = 738000
+
+
+def make_tracker() -> MutualFund:
+    tracker = MutualFund(is_downloadable=False, datasets=())
+    tracker.units = {"100001": [10, 100]}
+    tracker.json_data = InvestmentData()
+    tracker.json_data.funds["100001"] = NavData(
+        name="fund", nav=NavSeries([DAY, DAY + 1, DAY + 2], [10.0, 10.5, 11.0]), latestNavDate=DAY + 2,
+        invested=100,
+    )
+    tracker.Orders = OrderBook()
+    tracker.order_history = {}
+    tracker.ledger = LotLedger()
+    return tracker
+
+
+def test_due_orders_settle_without_a_changed_row():
+    tracker = make_tracker()
+    tracker.Orders.add("100001", DAY + 1, 2, 21)
+    tracker.Orders.add("100001", DAY + 2, 1, 11)
+
+    asyncio.run(tracker.settle_due_orders())
+    assert tracker.units["100001"] == [12, 121]
+    assert tracker.Orders.to_json() == {"100001": {"31-Jul-2021": [1, 11]}}
+
+
+def test_loaded_feed_without_changes_is_not_downloaded_again():
+    tracker = make_tracker()
+    tracker.nav_records_loaded = True
+
+    async def download() -> bool:
+        raise AssertionError("downloaded again")
+
+    tracker.download_all_nav_file = download
+    assert not asyncio.run(tracker.update_my_nav_file())
+
+
+def test_pnl_after_a_sale_uses_the_fifo_cost_basis():
+    tracker = make_tracker()
+    tracker.settle_order("100001", DAY + 1, [10, 200])
+    tracker.settle_order("100001", DAY + 2, [-10, -110])
+
+    result = compute_valuation(
+        {"100001": tracker.json_data.funds["100001"].nav}, {"100001": tracker.get_holding_flows("100001")}
+    )
+    value, invested, pnl = result.portfolio_series()
+    assert invested[-1] == tracker.ledger.holdings("100001")[1] == tracker.units["100001"][1] == 200
+    assert pnl[-1] == value[-1] - 200 == -90
+
+
+def test_seed_lot_is_dated_at_a_back_dated_first_order():
+    tracker = make_tracker()
+    tracker.units["100001"] = [20, 200]
+    tracker.order_history = {"100001": {DAY - 400: [10, 100]}}
+    tracker.seed_ledger("100001")
+
+    assert tracker.ledger.queue("100001").dates.tolist() == [DAY - 400, DAY - 400]
+    gains = tracker.ledger.capital_gains("100001", DAY + 2, 11.0)
+    assert (gains.unrealized_long, gains.unrealized_short) == (20, 0)
+
+
+def test_seed_lot_of_a_fund_without_navs_is_dated_at_its_first_order():
+    tracker = make_tracker()
+    tracker.json_data.funds["100001"].nav = NavSeries()
+    tracker.units["100001"] = [20, 200]
+    tracker.order_history = {"100001": {DAY: [10, 100]}}
+    tracker.seed_ledger("100001")
+
+    assert tracker.ledger.queue("100001").dates.tolist() == [DAY, DAY]
@@ -0,0 +1,29 @@
+from models.day_change import InvestmentData, NavData
+from util.portfolio_aggregates import apply_fund_delta, check_aggregates, contribution, recompute_totals
+
+
+def portfolio() -> InvestmentData:
+    data = InvestmentData(sumTotal=330, totalInvested=300, totalDaychange=3)
+    data.funds["100001"] = NavData(current=110, invested=100, dayChange=1)
+    data.funds["100002"] = NavData(current=220, invested=200, dayChange=2)
+    return data
+
+
+def test_funds_missing_from_units_are_not_counted():
+    assert recompute_totals(portfolio(), ["100001"]) == (110, 100, 1)
+
+
+def test_removed_fund_is_a_mismatch_until_its_delta_is_applied():
+    data = portfolio()
+    assert check_aggregates(data, ["100001", "100002"]) == []
+    assert len(check_aggregates(data, ["100001"])) == 3
+
+    apply_fund_delta(data, contribution(data.funds.pop("100002")), contribution(None))
+    assert check_aggregates(data, ["100001"]) == []
+    assert (data.sumTotal, data.totalInvested, data.totalProfit) == (110, 100, 10)
+
+
+def test_repair_takes_the_held_funds_only():
+    data = portfolio()
+    assert check_aggregates(data, ["100002"], repair=True)
+    assert (data.sumTotal, data.totalInvested, data.totalDaychange) == (220, 200, 2)
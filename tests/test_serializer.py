@@ -0,0 +1,18 @@
+import pytest
+
+from models.day_change import InvestmentData
+from util import serializer
+from util.benchmark_data import sample_investment_data
+
+
+@pytest.mark.parametrize("name", sorted(serializer.SERIALIZERS))
+def test_round_trip(name):
+    data = sample_investment_data(funds=3, years=1)
+    content = serializer.dumps(data, serializer.get_serializer(name))
+    assert serializer.loads(content, InvestmentData) == data
+
+
+def test_unknown_format_is_an_error(monkeypatch):
+    monkeypatch.setenv(serializer.FORMATS_ENV, "dayChange.json=yaml")
+    with pytest.raises(ValueError, match="no serializer yaml"):
+        serializer.serializer_for("dayChange.json")
@@ -0,0 +1,18 @@
+from util.benchmark_data import sample_investment_data
+from util.snapshot import InvestmentSnapshot, write_snapshot
+
+
+def test_round_trip(tmp_path):
+    data = sample_investment_data(funds=3, years=1)
+    data.funds["100001"].current, data.funds["100001"].xirr = 123.5, 7.25
+    write_snapshot(tmp_path / "dayChange.snapshot", data, (0, 0))
+
+    snapshot = InvestmentSnapshot.open(tmp_path / "dayChange.snapshot")
+    assert snapshot is not None
+    assert snapshot.investment_data() == data
+
+
+def test_other_files_are_not_snapshots(tmp_path):
+    (tmp_path / "dayChange.snapshot").write_bytes(b"{}")
+    assert InvestmentSnapshot.open(tmp_path / "dayChange.snapshot") is None
+    assert InvestmentSnapshot.open(tmp_path / "missing.snapshot") is None
@@ -0,0 +1,136 @@
+import asyncio
+import os
+
+from models.day_change import InvestmentData, NavData
+from models.nav_series import NavSeries
+from util.serializer import dump_file
+from util.snapshot import SnapshotFunds
+from util.storage import JsonStorage, SqliteStorage
+from util.write_behind import WriteBehind
+
+
+async def no_download(path) -> None:
+    await asyncio.sleep(0.01)  # like a real download, lets the other loaders run
+
+
+def json_files(folder) -> JsonStorage:
+    data = InvestmentData(sumTotal=110, totalInvested=100)
+    data.funds["100001"] = NavData(name="fund", nav=NavSeries([738000, 738001], [10.0, 11.0]), latestNavDate=738001)
+    dump_file(folder / "units.json", {"100001": [10, 100]})
+    dump_file(folder / "order.json", {"100001": {"07-May-2022": [1, 10]}})
+    dump_file(folder / "dayChange.json", data)
+    return JsonStorage(folder, no_download, WriteBehind())
+
+
+def stored_navs(storage: SqliteStorage, scheme_code: str) -> list[tuple[int, float]]:
+    return storage.connection.execute(
+        "SELECT nav_date, nav FROM navs WHERE scheme_code = ? ORDER BY nav_date", (scheme_code,)
+    ).fetchall()
+
+
+def test_concurrent_loaders_wait_for_the_migration(tmp_path):
+    storage = SqliteStorage(tmp_path / "tracker.db", migrate_from=json_files(tmp_path))
+
+    async def load_all():
+        return await asyncio.gather(storage.load_units(), storage.load_orders(), storage.load_investment_data())
+
+    units, orders, data = asyncio.run(load_all())
+    assert units == {"100001": [10, 100]}
+    assert orders == {"100001": {"07-May-2022": [1, 10]}}
+    assert list(data.funds["100001"].nav.navs) == [10.0, 11.0]
+    storage.close()
+
+
+def test_migration_is_recorded_in_the_database(tmp_path):
+    storage = SqliteStorage(tmp_path / "tracker.db", migrate_from=json_files(tmp_path))
+    asyncio.run(storage.load_units())
+    storage.close()
+
+    dump_file(tmp_path / "units.json", {"100002": [1, 1]})
+    reopened = SqliteStorage(tmp_path / "tracker.db", migrate_from=JsonStorage(tmp_path, no_download, WriteBehind()))
+    assert asyncio.run(reopened.load_units()) == {"100001": [10, 100]}
+    reopened.close()
+
+
+def test_interrupted_migration_is_retried(tmp_path):
+    SqliteStorage(tmp_path / "tracker.db").close()  # the file exists, but nothing was imported
+    storage = SqliteStorage(tmp_path / "tracker.db", migrate_from=json_files(tmp_path))
+    assert asyncio.run(storage.load_units()) == {"100001": [10, 100]}
+    storage.close()
+
+
+def test_nav_inserted_before_the_last_stored_date_is_stored(tmp_path):
+    storage = SqliteStorage(tmp_path / "tracker.db")
+    data = InvestmentData()
+    data.funds["100001"] = NavData(nav=NavSeries([738000, 738002], [10.0, 12.0]))
+    storage.save_investment_data(data)
+    asyncio.run(storage.flush())
+
+    data.funds["100001"].nav[738001] = 11.0
+    data.funds["100001"].nav[738003] = 13.0
+    storage.save_investment_data(data)
+    asyncio.run(storage.flush())
+    assert stored_navs(storage, "100001") == [(738000, 10.0), (738001, 11.0), (738002, 12.0), (738003, 13.0)]
+
+    data.funds["100001"].nav[738004] = 14.0
+    storage.save_investment_data(data)
+    asyncio.run(storage.flush())
+    assert len(stored_navs(storage, "100001")) == 5
+    storage.close()
+
+
+def test_day_change_written_by_another_process_is_reloaded(tmp_path):
+    storage = json_files(tmp_path)
+    assert storage.external_changes() == (None, None, None)
+
+    dump_file(tmp_path / "dayChange.json", InvestmentData(sumTotal=120, totalInvested=100))
+    os.utime(tmp_path / "dayChange.json", ns=(0, 10**9))
+    units, orders, investment_data = storage.external_changes()
+    assert (units, orders) == (None, None)
+    assert investment_data.sumTotal == 120
+    assert storage.external_changes() == (None, None, None)
+
+
+def test_sqlite_commit_of_another_connection_is_reloaded(tmp_path):
+    storage = SqliteStorage(tmp_path / "tracker.db")
+    other = SqliteStorage(tmp_path / "tracker.db")
+    assert storage.external_changes() == (None, None, None)
+
+    other.save_investment_data(InvestmentData(sumTotal=120))
+    asyncio.run(other.flush())
+    assert storage.external_changes().investment_data.sumTotal == 120
+    assert storage.external_changes() == (None, None, None)
+    storage.close()
+    other.close()
+
+
+def test_day_change_is_loaded_from_its_snapshot_until_the_file_changes(tmp_path):
+    storage = json_files(tmp_path)
+    first = asyncio.run(storage.load_investment_data())
+    assert isinstance(first.funds, dict)
+
+    second = asyncio.run(storage.load_investment_data())
+    assert isinstance(second.funds, SnapshotFunds)
+    assert second == first
+
+    dump_file(tmp_path / "dayChange.json", InvestmentData(sumTotal=120))
+    os.utime(tmp_path / "dayChange.json", ns=(0, 10**9))
+    third = asyncio.run(storage.load_investment_data())
+    assert isinstance(third.funds, dict)
+    assert third.sumTotal == 120
+
+
+def test_snapshot_is_closed_before_it_is_replaced(tmp_path):
+    storage = json_files(tmp_path)
+    asyncio.run(storage.load_investment_data())
+    data = asyncio.run(storage.load_investment_data())
+    snapshot = storage.snapshot
+    assert snapshot is not None
+
+    data.sumTotal = 130
+    storage.save_investment_data(data)
+    asyncio.run(storage.flush())
+    assert storage.snapshot is None
+    assert snapshot.buffer.closed
+    assert list(data.funds["100001"].nav.navs) == [10.0, 11.0]
+    assert asyncio.run(storage.load_investment_data()).sumTotal == 130
@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+from typing import Mapping, Optional, Sequence
+
+import numpy as np
+
+from models.nav_series import NavSeries
+
+DAYS_PER_YEAR = 365.0
+# shorter spans get the absolute return, compounding a few days' move blows it up to absurd rates
+MIN_ANNUALIZED_DAYS = DAYS_PER_YEAR
+# bisection brackets log(1 + rate), i.e. rates from -99.99% to +1000000% a year
+LOG_RATE_BOUNDS = (np.log(1e-4), np.log(1e4))
+
+CashFlow = tuple[int, float]  # (day ordinal, amount), money put in is negative
+
+
+@dataclass
+class ReturnsResult:
+    """
+    annualized returns in percent (absolute returns for spans under MIN_ANNUALIZED_DAYS),
+    None where a fund's cash flows have no solution
+    """
+    xirr: dict[str, Optional[float]]
+    cagr: dict[str, Optional[float]]
+    total_xirr: Optional[float]
+
+
+def pack_cash_flows(flows: Sequence[Sequence[CashFlow]]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    ragged per fund flows -> (years since the fund's first flow, amounts), both (funds, max flows),
+    padded with zero amounts so the padding drops out of every sum
+    """
+    width = max((len(fund_flows) for fund_flows in flows), default=0)
+    years = np.zeros((len(flows), width))
+    amounts = np.zeros((len(flows), width))
+    for row, fund_flows in enumerate(flows):
+        if not fund_flows:
+            continue
+        dates = np.fromiter((date for date, _ in fund_flows), dtype=np.float64, count=len(fund_flows))
+        years[row, :len(fund_flows)] = (dates - dates.min()) / DAYS_PER_YEAR
+        amounts[row, :len(fund_flows)] = [amount for _, amount in fund_flows]
+    return years, amounts
+
+
+def _npv(log_rate: np.ndarray, years: np.ndarray, amounts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    net present value of every row at rate exp(log_rate) - 1 and its derivative in log_rate
+    """
+    discounted = amounts * np.exp(-log_rate[:, None] * years)
+    return discounted.sum(axis=1), -(discounted * years).sum(axis=1)
+
+
+def batched_xirr(
+        years: np.ndarray,
+        amounts: np.ndarray,
+        tol: float = 1e-9,
+        newton_steps: int = 50,
+        bisect_steps: int = 100,
+) -> np.ndarray:
+    """
+    money weighted annual return of every row of cash flows, solved for all rows at once.
+    newton runs on log(1 + rate) from 10%, rows it doesn't settle fall back to bisection.
+    NaN where a row doesn't have both money in and money out, or has them all on one day
+    """
+    solvable = (
+        (amounts < 0).any(axis=1) & (amounts > 0).any(axis=1) & (years.max(axis=1, initial=0) > 0)
+    )
+    scale = np.maximum(np.abs(amounts).sum(axis=1), 1e-12)
+    low, high = LOG_RATE_BOUNDS
+
+    log_rate = np.full(len(amounts), np.log1p(0.1))
+    stepped = np.zeros(len(amounts), dtype=bool)  # the starting guess itself is never an answer
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        for _ in range(newton_steps):
+            value, slope = _npv(log_rate, years, amounts)
+            step = np.where(slope != 0, value / slope, 0)
+            stepped |= step != 0
+            log_rate = np.clip(log_rate - step, low, high)
+            if (np.abs(step) < tol).all():
+                break
+
+        value, _ = _npv(log_rate, years, amounts)
+        unsettled = solvable & ~(stepped & (np.abs(value) / scale < tol))
+        if unsettled.any():
+            rows = np.flatnonzero(unsettled)
+            lo = np.full(len(rows), low)
+            hi = np.full(len(rows), high)
+            sign_at_lo = np.sign(_npv(lo, years[rows], amounts[rows])[0])
+            for _ in range(bisect_steps):
+                mid = (lo + hi) / 2
+                same_side = np.sign(_npv(mid, years[rows], amounts[rows])[0]) == sign_at_lo
+                lo = np.where(same_side, mid, lo)
+                hi = np.where(same_side, hi, mid)
+            log_rate[rows] = (lo + hi) / 2
+            value[rows] = _npv(log_rate[rows], years[rows], amounts[rows])[0]
+
+    rate = np.expm1(log_rate)
+    rate[~solvable | ~(np.abs(value) / scale < 1e-6)] = np.nan
+    return rate
+
+
+def absolute_return(amounts: np.ndarray) -> np.ndarray:
+    """
+    money out over money in minus one, per row of cash flows. NaN where nothing was put in
+    """
+    paid = -np.minimum(amounts, 0).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(paid > 0, np.maximum(amounts, 0).sum(axis=1) / paid - 1, np.nan)
+
+
+def nav_cagr(nav: NavSeries, start: int, end: int) -> float:
+    """
+    annual growth of the fund's NAV between two dates, from its first tracked NAV when the history
+    starts after start. the plain growth over spans under MIN_ANNUALIZED_DAYS, NaN when there is no span
+    """
+    if not nav:
+        return np.nan
+    first, last = nav.on_or_before(start) or (nav.dates[0], nav.navs[0]), nav.on_or_before(end)
+    if last is None or last[0] <= first[0] or first[1] <= 0:
+        return np.nan
+    if last[0] - first[0] < MIN_ANNUALIZED_DAYS:
+        return last[1] / first[1] - 1
+    return (last[1] / first[1]) ** (DAYS_PER_YEAR / (last[0] - first[0])) - 1
+
+
+def _percent(rate: float) -> Optional[float]:
+    return None if np.isnan(rate) else round(float(rate) * 100, 3)
+
+
+def compute_returns(
+        flows: Mapping[str, Sequence[CashFlow]],
+        valuations: Mapping[str, CashFlow],
+        navs: Mapping[str, NavSeries],
+) -> ReturnsResult:
+    """
+    flows: dated investments per fund (negative amounts), valuations: (NAV date, current value) per fund.
+    the funds and the whole portfolio are solved together in one batched run, rows spanning less
+    than MIN_ANNUALIZED_DAYS get their absolute return instead
+    """
+    fund_ids = list(flows)
+    rows = [list(flows[fund_id]) + [valuations[fund_id]] for fund_id in fund_ids]
+    as_of = max((date for date, _ in valuations.values()), default=0)
+    rows.append(
+        [flow for fund_id in fund_ids for flow in flows[fund_id]]
+        + [(as_of, sum(value for _, value in valuations.values()))]
+    )
+    years, amounts = pack_cash_flows(rows)
+    rates = batched_xirr(years, amounts)
+    short = years.max(axis=1, initial=0) * DAYS_PER_YEAR < MIN_ANNUALIZED_DAYS
+    rates[short] = absolute_return(amounts[short])
+
+    cagr = {}
+    for fund_id in fund_ids:
+        start = min((date for date, _ in flows[fund_id]), default=valuations[fund_id][0])
+        cagr[fund_id] = _percent(nav_cagr(navs[fund_id], start, valuations[fund_id][0]))
+    return ReturnsResult(
+        xirr={fund_id: _percent(rate) for fund_id, rate in zip(fund_ids, rates)},
+        cagr=cagr,
+        total_xirr=_percent(rates[-1]),
+    )
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    funds, months = 40, 60
+    sample_flows = [
+        [(738000 + 30 * month, -float(rng.integers(1, 10)) * 1000) for month in range(months)]
+        for _ in range(funds)
+    ]
+    for fund_flows in sample_flows:
+        invested = -sum(amount for _, amount in fund_flows)
+        fund_flows.append((738000 + 30 * months, invested * rng.uniform(0.8, 1.6)))
+
+    begin = time.perf_counter()
+    batched = batched_xirr(*pack_cash_flows(sample_flows))
+    print(f"{funds} funds x {months} flows, batched: {(time.perf_counter() - begin) * 1000:.2f} ms")
+
+    begin = time.perf_counter()
+    one_by_one = np.concatenate([batched_xirr(*pack_cash_flows([fund_flows])) for fund_flows in sample_flows])
+    print(f"{funds} funds x {months} flows, one at a time: {(time.perf_counter() - begin) * 1000:.2f} ms")
+    assert np.allclose(batched, one_by_one)
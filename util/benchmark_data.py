@@ -0,0 +1,20 @@
+import numpy as np
+
+from models.day_change import InvestmentData, NavData
+from models.nav_series import NavSeries
+
+
+def sample_investment_data(funds: int = 40, years: int = 5, seed: int = 0) -> InvestmentData:
+    """
+    a portfolio of random walk NAV histories, one NAV a day, for the benchmarks of the storage formats
+    """
+    rng = np.random.default_rng(seed)
+    days = years * 365
+    data = InvestmentData()
+    for code in range(funds):
+        data.funds[str(100000 + code)] = NavData(
+            name=f"fund {code}",
+            nav=NavSeries(range(738000, 738000 + days), 10 * np.exp(np.cumsum(rng.normal(0.0004, 0.01, days)))),
+            latestNavDate=738000 + days - 1,
+        )
+    return data
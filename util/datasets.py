@@ -0,0 +1,44 @@
+from typing import Any
+
+UNITS = "units"  # units.json
+ORDERS = "orders"  # order.json
+INVESTMENT = "investment"  # dayChange.json, every fund's NAV history
+HISTORY = "history"  # order_history.json and lots.json
+ALL_DATASETS = frozenset({UNITS, ORDERS, INVESTMENT, HISTORY})
+
+
+class DatasetNotLoaded(RuntimeError):
+    pass
+
+
+class NoFundsTracked(RuntimeError):
+    """
+    units.json is empty, raised instead of exiting so the other loaders of the command are not
+    cancelled half way
+    """
+
+
+class Dataset:
+    """
+    an attribute holding one loaded data file. reading it before the file was loaded raises instead
+    of silently loading it, the command has to declare the dataset (or await its loading)
+    """
+
+    def __init__(self, dataset: str):
+        self.dataset = dataset
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        if instance is None:
+            return self
+        try:
+            return instance.__dict__[self.name]
+        except KeyError:
+            raise DatasetNotLoaded(
+                f"{self.name} needs the {self.dataset} dataset, which this command didn't load"
+            ) from None
+
+    def __set__(self, instance: Any, value: Any) -> None:
+        instance.__dict__[self.name] = value
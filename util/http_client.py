@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+import aiohttp
+
+
+@dataclass
+class HttpClientConfig:
+    total_timeout: float = 20
+    connect_timeout: float = 10
+    limit: int = 20
+    limit_per_host: int = 4
+    keepalive_timeout: float = 60
+    dns_cache_ttl: int = 300
+
+
+@dataclass
+class HttpStats:
+    requests: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+
+
+class HttpClient:
+    """
+    owns the pooled aiohttp session shared by every network call of the process:
+    keep-alive connections, cached DNS, a per host connection limit and default timeouts
+    """
+
+    def __init__(self, config: Optional[HttpClientConfig] = None):
+        self.config = config or HttpClientConfig()
+        self.stats = HttpStats()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+        stats = self.stats
+
+        async def on_request_start(session, context, params):
+            stats.requests += 1
+
+        async def on_connection_create_end(session, context, params):
+            stats.connections_created += 1
+
+        async def on_connection_reuseconn(session, context, params):
+            stats.connections_reused += 1
+
+        async def on_dns_cache_hit(session, context, params):
+            stats.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(session, context, params):
+            stats.dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=self.config.limit,
+                limit_per_host=self.config.limit_per_host,
+                ttl_dns_cache=self.config.dns_cache_ttl,
+                use_dns_cache=True,
+                keepalive_timeout=self.config.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(
+                    total=self.config.total_timeout, connect=self.config.connect_timeout
+                ),
+                trace_configs=[self._trace_config()],
+            )
+            self._loop = loop
+        return self._session
+
+    async def get_bytes(self, url: str, **kwargs) -> bytes:
+        async with self.session.get(url, **kwargs) as res:
+            res.raise_for_status()
+            return await res.read()
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logging.info("http client closed: %s", self.stats)
+        self._session = None
+        self._loop = None
+
+
+_client: Optional[HttpClient] = None
+
+
+def get_http_client() -> HttpClient:
+    global _client
+    if _client is None:
+        _client = HttpClient()
+    return _client
+
+
+def configure_http_client(config: HttpClientConfig) -> HttpClient:
+    global _client
+    _client = HttpClient(config)
+    return _client
+
+
+async def close_http_client() -> None:
+    if _client is not None:
+        await _client.close()
+
+
+def configure_requests_session(session, config: Optional[HttpClientConfig] = None):
+    """
+    pool settings for a blocking requests.Session, used for libraries (nsepy) that bring their own session
+    """
+    from requests.adapters import HTTPAdapter
+
+    config = config or get_http_client().config
+    adapter = HTTPAdapter(pool_connections=config.limit, pool_maxsize=config.limit_per_host)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def requests_session_stats(session) -> HttpStats:
+    """
+    connection reuse of a requests.Session, read from its urllib3 pools
+    """
+    stats = HttpStats()
+    for adapter in session.adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            stats.requests += pool.num_requests
+            stats.connections_created += pool.num_connections
+    stats.connections_reused = stats.requests - stats.connections_created
+    return stats
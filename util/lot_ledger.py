@@ -0,0 +1,243 @@
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass
+from itertools import accumulate
+from typing import Iterable, Mapping
+
+# equity oriented funds: a lot held for more than a year is long term
+LONG_TERM_DAYS = 365
+EPSILON = 1e-9
+
+
+@dataclass(slots=True)
+class RealizedGain:
+    """
+    the part of one lot consumed by a sale
+    """
+    buy_date: int  # day ordinal
+    sell_date: int
+    units: float
+    cost: float
+    proceeds: float
+
+    @property
+    def gain(self) -> float:
+        return self.proceeds - self.cost
+
+    def is_long_term(self, long_term_days: int = LONG_TERM_DAYS) -> bool:
+        return self.sell_date - self.buy_date > long_term_days
+
+
+@dataclass(slots=True)
+class CapitalGains:
+    realized_short: float = 0
+    realized_long: float = 0
+    unrealized_short: float = 0
+    unrealized_long: float = 0
+
+
+class LotQueue:
+    """
+    the lots of one fund in purchase order with running totals of units and cost.
+    FIFO sales never touch the lots: they only move a cut point (consumed_units) along the running
+    units total, so a sale costs O(lots it crosses) and holdings / the long vs short term split are
+    a bisect away, however many SIP lots the fund has
+    """
+
+    __slots__ = ("dates", "units", "costs", "cum_units", "cum_costs", "head", "consumed_units", "consumed_cost")
+
+    def __init__(self, dates: Iterable[int] = (), units: Iterable[float] = (), costs: Iterable[float] = ()):
+        self.dates = array("i", dates)
+        self.units = array("d", units)
+        self.costs = array("d", costs)
+        if not len(self.dates) == len(self.units) == len(self.costs):
+            raise ValueError("dates, units and costs must have the same length")
+        self.cum_units = array("d", accumulate(self.units))
+        self.cum_costs = array("d", accumulate(self.costs))
+        self.head = 0  # first lot that isn't fully sold
+        self.consumed_units = 0.0
+        self.consumed_cost = 0.0
+
+    def __len__(self) -> int:
+        """
+        number of open lots
+        """
+        return len(self.dates) - self.head
+
+    def _units_before(self, index: int) -> float:
+        return self.cum_units[index - 1] if index else 0.0
+
+    def _costs_before(self, index: int) -> float:
+        return self.cum_costs[index - 1] if index else 0.0
+
+    @property
+    def remaining_units(self) -> float:
+        return self.cum_units[-1] - self.consumed_units if self.dates else 0.0
+
+    @property
+    def remaining_cost(self) -> float:
+        return self.cum_costs[-1] - self.consumed_cost if self.dates else 0.0
+
+    def buy(self, date: int, units: float, cost: float) -> None:
+        if not self.dates or date >= self.dates[-1]:
+            self.dates.append(date)
+            self.units.append(units)
+            self.costs.append(cost)
+            self.cum_units.append(self._units_before(len(self.dates) - 1) + units)
+            self.cum_costs.append(self._costs_before(len(self.dates) - 1) + cost)
+            return
+        # a back dated lot. it can't go in front of lots that are already (partly) sold, that would
+        # rewrite past sales, so it is dated no earlier than the oldest open lot
+        if self.head < len(self.dates):
+            date = max(date, self.dates[self.head])
+        index = max(bisect_right(self.dates, date), self.head)
+        self.dates.insert(index, date)
+        self.units.insert(index, units)
+        self.costs.insert(index, cost)
+        self.cum_units[index:] = array("d", accumulate(self.units[index:], initial=self._units_before(index)))[1:]
+        self.cum_costs[index:] = array("d", accumulate(self.costs[index:], initial=self._costs_before(index)))[1:]
+
+    def sell(self, date: int, units: float, proceeds: float) -> list[RealizedGain]:
+        if units > self.remaining_units + EPSILON:
+            raise ValueError(f"can't sell {units} units, only {self.remaining_units} held")
+        start = self.consumed_units
+        end = start + min(units, self.remaining_units)
+        realized = []
+        index = self.head
+        while index < len(self.dates) and self._units_before(index) < end - EPSILON:
+            taken = min(self.cum_units[index], end) - max(self._units_before(index), start)
+            if taken > EPSILON:
+                cost = self.costs[index] * taken / self.units[index]
+                self.consumed_cost += cost
+                realized.append(
+                    RealizedGain(self.dates[index], date, taken, cost, proceeds * taken / units)
+                )
+            if self.cum_units[index] > end + EPSILON:
+                break
+            index += 1
+        self.head = index
+        self.consumed_units = end
+        if self.head == len(self.dates):
+            self.consumed_cost = self.cum_costs[-1]  # no float residue once everything is sold
+        return realized
+
+    def split(self, cutoff_date: int) -> tuple[float, float, float, float]:
+        """
+        (units, cost) still held from lots bought on or before cutoff_date, then from the later ones
+        """
+        index = max(bisect_right(self.dates, cutoff_date), self.head)
+        old_units = max(self._units_before(index) - self.consumed_units, 0.0)
+        old_cost = max(self._costs_before(index) - self.consumed_cost, 0.0)
+        return old_units, old_cost, self.remaining_units - old_units, self.remaining_cost - old_cost
+
+    def to_json(self) -> dict[str, list]:
+        """
+        open lots only, sold lots are dropped and a partly sold head lot keeps what is left of it
+        """
+        head = self.head
+        if head == len(self.dates):
+            return {"dates": [], "units": [], "costs": []}
+        units = self.units[head:].tolist()
+        costs = self.costs[head:].tolist()
+        units[0] = self.cum_units[head] - self.consumed_units
+        costs[0] = self.cum_costs[head] - self.consumed_cost
+        return {"dates": self.dates[head:].tolist(), "units": units, "costs": costs}
+
+    @classmethod
+    def from_json(cls, data: Mapping[str, list]) -> "LotQueue":
+        return cls(data["dates"], data["units"], data["costs"])
+
+
+class LotLedger:
+    """
+    every purchase lot of every fund plus the realized gains of the sales matched against them
+    """
+
+    def __init__(self, long_term_days: int = LONG_TERM_DAYS):
+        self.long_term_days = long_term_days
+        self.queues: dict[str, LotQueue] = {}
+        self.realized: dict[str, list[RealizedGain]] = {}
+
+    def __contains__(self, fund_id: str) -> bool:
+        return fund_id in self.queues
+
+    def queue(self, fund_id: str) -> LotQueue:
+        if fund_id not in self.queues:
+            self.queues[fund_id] = LotQueue()
+        return self.queues[fund_id]
+
+    def buy(self, fund_id: str, date: int, units: float, amount: float) -> None:
+        self.queue(fund_id).buy(date, units, amount)
+
+    def sell(self, fund_id: str, date: int, units: float, proceeds: float) -> list[RealizedGain]:
+        realized = self.queue(fund_id).sell(date, units, proceeds)
+        self.realized.setdefault(fund_id, []).extend(realized)
+        return realized
+
+    def holdings(self, fund_id: str) -> tuple[float, float]:
+        """
+        units held and their cost
+        """
+        lots = self.queues.get(fund_id)
+        return (lots.remaining_units, lots.remaining_cost) if lots else (0.0, 0.0)
+
+    def realized_cost(self, fund_id: str) -> float:
+        return sum(gain.cost for gain in self.realized.get(fund_id, ()))
+
+    def capital_gains(self, fund_id: str, as_of: int, nav: float) -> CapitalGains:
+        """
+        realized gains split by holding period, plus the unrealized gain of the open lots at nav on as_of
+        """
+        gains = CapitalGains()
+        for gain in self.realized.get(fund_id, ()):
+            if gain.is_long_term(self.long_term_days):
+                gains.realized_long += gain.gain
+            else:
+                gains.realized_short += gain.gain
+        lots = self.queues.get(fund_id)
+        if lots:
+            long_units, long_cost, short_units, short_cost = lots.split(as_of - self.long_term_days - 1)
+            gains.unrealized_long = long_units * nav - long_cost
+            gains.unrealized_short = short_units * nav - short_cost
+        return gains
+
+    def to_json(self) -> dict[str, dict]:
+        return {
+            fund_id: {
+                "lots": lots.to_json(),
+                "realized": [
+                    [gain.buy_date, gain.sell_date, gain.units, gain.cost, gain.proceeds]
+                    for gain in self.realized.get(fund_id, ())
+                ],
+            }
+            for fund_id, lots in self.queues.items()
+        }
+
+    @classmethod
+    def from_json(cls, data: Mapping[str, Mapping], long_term_days: int = LONG_TERM_DAYS) -> "LotLedger":
+        ledger = cls(long_term_days)
+        for fund_id, fund_data in data.items():
+            ledger.queues[fund_id] = LotQueue.from_json(fund_data["lots"])
+            ledger.realized[fund_id] = [RealizedGain(*gain) for gain in fund_data.get("realized", ())]
+        return ledger
+
+
+if __name__ == "__main__":
+    import time
+
+    sip_lots = 50_000
+    ledger = LotLedger()
+    begin = time.perf_counter()
+    for day in range(sip_lots):
+        ledger.buy("100000", 730000 + day, 10.0, 1000.0)
+    print(f"{sip_lots} SIP lots bought: {(time.perf_counter() - begin) * 1000:.2f} ms")
+
+    begin = time.perf_counter()
+    for month in range(120):
+        ledger.sell("100000", 730000 + sip_lots + month, 25.0, 3000.0)
+    gains = ledger.capital_gains("100000", 730000 + sip_lots + 120, 120.0)
+    print(f"120 redemptions + gains: {(time.perf_counter() - begin) * 1000:.2f} ms, {gains}")
+
+    begin = time.perf_counter()
+    LotLedger.from_json(ledger.to_json())
+    print(f"json round trip: {(time.perf_counter() - begin) * 1000:.2f} ms")
@@ -0,0 +1,140 @@
+import gzip
+import logging
+import os
+import pathlib
+import tempfile
+import time
+from typing import AbstractSet, AsyncIterable, AsyncIterator, Optional
+
+from util.nav_parser import CHUNK_SIZE, NavRecord, parse_nav_stream
+
+ARCHIVE_SUFFIX = ".txt.gz"
+# a temp file untouched for this long was left behind by a run that died mid download
+STALE_PART_SECONDS = 3600
+
+
+class NavArchiveWriter:
+    """
+    gzip the feed into a temp file while it streams, it only gets its content address once
+    the whole body (and therefore its hash) is known
+    """
+
+    def __init__(self, archive: "NavArchive"):
+        self.archive = archive
+        fd, temp_name = tempfile.mkstemp(dir=archive.root, suffix=".part")
+        self.temp_path = pathlib.Path(temp_name)
+        self.file = gzip.GzipFile(fileobj=os.fdopen(fd, "wb"), mode="wb")
+
+    async def tee(self, chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            self.file.write(chunk)
+            yield chunk
+
+    def _close(self) -> None:
+        if not self.file.closed:
+            fileobj = self.file.fileobj
+            self.file.close()
+            fileobj.close()
+
+    def commit(self, content_hash: str) -> pathlib.Path:
+        self._close()
+        path = self.archive.path_for(content_hash)
+        if path.exists():
+            # already archived, only refresh its age so eviction keeps it around
+            self.temp_path.unlink(missing_ok=True)
+            os.utime(path)
+            logging.info("NAV snapshot %s already archived", content_hash)
+        else:
+            os.replace(self.temp_path, path)
+            logging.info("archived NAV snapshot %s", content_hash)
+        self.archive.evict()
+        return path
+
+    def abort(self) -> None:
+        self._close()
+        self.temp_path.unlink(missing_ok=True)
+
+
+class NavArchive:
+    """
+    content addressed store of raw NAV feeds, every snapshot is saved once as <md5>.txt.gz
+    """
+
+    def __init__(
+            self,
+            root: str | pathlib.Path,
+            max_bytes: int = 200 * 1024 * 1024,
+            max_age_days: Optional[int] = 365,
+    ):
+        self.root = pathlib.Path(root)
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, content_hash: str) -> pathlib.Path:
+        return self.root.joinpath(content_hash + ARCHIVE_SUFFIX)
+
+    def __contains__(self, content_hash: str) -> bool:
+        return self.path_for(content_hash).exists()
+
+    def writer(self) -> NavArchiveWriter:
+        return NavArchiveWriter(self)
+
+    def snapshots(self) -> list[tuple[str, float, int]]:
+        """
+        (hash, mtime, compressed size) of every stored snapshot, newest first
+        """
+        entries = []
+        for path in self.root.glob("*" + ARCHIVE_SUFFIX):
+            stat = path.stat()
+            entries.append((path.name[: -len(ARCHIVE_SUFFIX)], stat.st_mtime, stat.st_size))
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)
+
+    def latest(self) -> Optional[str]:
+        entries = self.snapshots()
+        return entries[0][0] if entries else None
+
+    def evict(self) -> list[str]:
+        """
+        drop snapshots older than max_age_days, then the oldest ones until the archive fits in max_bytes.
+        temp files abandoned by an interrupted download are removed too
+        """
+        stale = time.time() - STALE_PART_SECONDS
+        for part in self.root.glob("*.part"):
+            try:
+                if part.stat().st_mtime < stale:
+                    part.unlink()
+                    logging.info("removed abandoned %s", part.name)
+            except FileNotFoundError:
+                pass
+        evicted = []
+        entries = self.snapshots()
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            evicted.extend(entry[0] for entry in entries if entry[1] < cutoff)
+            entries = [entry for entry in entries if entry[1] >= cutoff]
+        total = sum(entry[2] for entry in entries)
+        while entries and total > self.max_bytes:
+            content_hash, _, size = entries.pop()
+            evicted.append(content_hash)
+            total -= size
+        for content_hash in evicted:
+            self.path_for(content_hash).unlink(missing_ok=True)
+            logging.info("evicted NAV snapshot %s", content_hash)
+        return evicted
+
+    async def iter_chunks(self, content_hash: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        path = self.path_for(content_hash)
+        if not path.exists():
+            raise FileNotFoundError(f"NAV snapshot {content_hash} is not archived")
+        with gzip.open(path, "rb") as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+    def parse(
+            self, content_hash: str, scheme_codes: Optional[AbstractSet[str]] = None
+    ) -> AsyncIterator[NavRecord]:
+        """
+        replay a stored snapshot through the same parsing pipeline as a live download
+        """
+        return parse_nav_stream(self.iter_chunks(content_hash), scheme_codes)
@@ -0,0 +1,117 @@
+import logging
+import pathlib
+from typing import AbstractSet, Iterable, Iterator, NamedTuple, Optional
+
+from models.day_change import InvestmentData
+from models.nav_date import parse_nav_date
+from models.nav_series import NavSeries
+
+# column layout of the AMFI "NAV history" text export, used when a file has no header row
+HISTORY_COLUMNS = {
+    "Scheme Code": 0,
+    "Scheme Name": 1,
+    "Net Asset Value": 4,
+    "Date": 7,
+}
+
+
+class HistoryRow(NamedTuple):
+    scheme_code: str
+    name: str
+    nav: float
+    date: int  # day ordinal
+
+
+def read_history_header(line: str) -> Optional[dict[str, int]]:
+    """
+    column positions from the "Scheme Code;Scheme Name;...;Date" header row of a report file
+    """
+    columns = [column.strip() for column in line.split(";")]
+    if not columns or columns[0] != "Scheme Code":
+        return None
+    positions = {name: index for index, name in enumerate(columns)}
+    if not all(name in positions for name in HISTORY_COLUMNS):
+        return None
+    return {name: positions[name] for name in HISTORY_COLUMNS}
+
+
+def parse_history_line(line: str, columns: dict[str, int]) -> Optional[HistoryRow]:
+    """
+    returns None for blank, AMC, category lines and rows without a numeric NAV
+    """
+    line = line.strip()
+    if not line or not line[0].isdigit():
+        return None
+    parts = line.split(";")
+    if len(parts) <= max(columns.values()):
+        return None
+    try:
+        nav = float(parts[columns["Net Asset Value"]])
+        date = parse_nav_date(parts[columns["Date"]])
+    except ValueError:
+        return None
+    return HistoryRow(
+        scheme_code=parts[columns["Scheme Code"]].strip(),
+        name=parts[columns["Scheme Name"]].split("-")[0].strip(),
+        nav=nav,
+        date=date,
+    )
+
+
+def iter_history_file(
+        path: str | pathlib.Path, scheme_codes: AbstractSet[str]
+) -> Iterator[HistoryRow]:
+    """
+    stream one report file line by line, only rows of the given schemes are parsed
+    """
+    columns = HISTORY_COLUMNS
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        for line in file:
+            header = read_history_header(line)
+            if header is not None:
+                columns = header
+                continue
+            end = line.find(";")
+            if end == -1 or line[:end].strip() not in scheme_codes:
+                continue
+            row = parse_history_line(line, columns)
+            if row is not None:
+                yield row
+
+
+def backfill_nav_history(
+        json_data: InvestmentData,
+        paths: Iterable[str | pathlib.Path],
+        scheme_codes: AbstractSet[str],
+) -> dict[str, int]:
+    """
+    merge AMFI history report files into the per fund NAV histories, in date order.
+    memory is bounded by the tracked funds' histories, not by the size of the files,
+    and importing the same file twice leaves the data unchanged.
+    returns the number of new dates added per fund.
+    a tracked fund without an entry yet is skipped, its entry (invested, units) is only made by
+    the next NAV update
+    """
+    missing = sorted(scheme_code for scheme_code in scheme_codes if scheme_code not in json_data.funds)
+    if missing:
+        logging.warning("--not backfilling %s, run an update first--", ", ".join(missing))
+    scheme_codes = frozenset(scheme_codes).difference(missing)
+    imported: dict[str, dict[int, float]] = {}
+    for path in paths:
+        logging.info("--backfilling NAV history from %s--", path)
+        for row in iter_history_file(path, scheme_codes):
+            imported.setdefault(row.scheme_code, {})[row.date] = row.nav
+
+    added: dict[str, int] = {}
+    for scheme_code, history in imported.items():
+        fund = json_data.funds[scheme_code]
+        new_dates = [date for date in history if date not in fund.nav]
+        if not new_dates:
+            continue
+        history.update(fund.nav.items())
+        fund.nav = NavSeries.from_mapping(history)
+        if not fund.latestNavDate:
+            fund.latestNavDate = fund.nav.latest()[0]
+        added[scheme_code] = len(new_dates)
+        logging.info("--added %s NAV dates to %s--", len(new_dates), fund.name)
+    return added
@@ -0,0 +1,160 @@
+import codecs
+from dataclasses import dataclass, field
+from typing import AbstractSet, AsyncIterable, AsyncIterator, Optional
+
+from models.nav_date import parse_nav_date
+
+CHUNK_SIZE = 64 * 1024
+
+
+@dataclass(slots=True)
+class NavRecord:
+    """
+    One scheme row of the AMFI navopen.txt feed
+    Scheme Code;ISIN Div Payout/ ISIN Growth;ISIN Div Reinvestment;Scheme Name;Net Asset Value;Date
+    """
+    scheme_code: str
+    isin: str
+    isin_reinvestment: str
+    name: str
+    nav: float
+    date: int  # day ordinal
+    raw: str = field(default="", repr=False)
+
+
+def parse_nav_line(line: str) -> Optional[NavRecord]:
+    """
+    parse a single feed line, returns None for headers, AMC / category lines
+    and schemes without a numeric NAV
+    """
+    line = line.strip()
+    if not line or not line[0].isdigit():
+        return None
+    parts = line.split(";")
+    if len(parts) < 6:
+        return None
+    try:
+        nav = float(parts[4])
+        date = parse_nav_date(parts[5])
+    except ValueError:
+        return None
+    return NavRecord(
+        scheme_code=parts[0],
+        isin=parts[1],
+        isin_reinvestment=parts[2],
+        name=parts[3].split("-")[0].strip(),
+        nav=nav,
+        date=date,
+        raw=line,
+    )
+
+
+async def iter_lines(chunks: AsyncIterable[bytes], encoding: str = "utf-8") -> AsyncIterator[str]:
+    """
+    split an async stream of byte chunks into lines without ever joining the whole body,
+    a partial line at the end of a chunk is carried over to the next one
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+def scheme_code_of(line: str) -> str:
+    """
+    first ';' separated field of a feed line, without splitting the rest of it
+    """
+    end = line.find(";")
+    return line if end == -1 else line[:end].strip()
+
+
+async def filter_scheme_lines(lines: AsyncIterable[str], scheme_codes: AbstractSet[str]) -> AsyncIterator[str]:
+    """
+    keep only the lines whose scheme code is in scheme_codes, a single hash lookup per line
+    so the cost does not depend on how many funds are tracked
+    """
+    async for line in lines:
+        if scheme_code_of(line) in scheme_codes:
+            yield line
+
+
+async def parse_nav_stream(
+        chunks: AsyncIterable[bytes], scheme_codes: Optional[AbstractSet[str]] = None
+) -> AsyncIterator[NavRecord]:
+    """
+    yield parsed records as soon as the chunk containing them arrives,
+    when scheme_codes is given every other scheme is dropped before it is parsed
+    """
+    lines = iter_lines(chunks)
+    if scheme_codes is not None:
+        lines = filter_scheme_lines(lines, scheme_codes)
+    async for line in lines:
+        record = parse_nav_line(line)
+        if record is not None:
+            yield record
+
+
+async def hash_chunks(chunks: AsyncIterable[bytes], hasher) -> AsyncIterator[bytes]:
+    """
+    pass chunks through while feeding every one of them to a hashlib object
+    """
+    async for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+
+async def iter_response_chunks(content, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    read an aiohttp response body chunk by chunk, see hash_chunks to hash it on the way
+    """
+    async for chunk in content.iter_chunked(chunk_size):
+        yield chunk
+
+
+if __name__ == "__main__":
+    # benchmark: exact scheme code lookup vs the old regex alternation over a feed sized like navopen.txt
+    import asyncio
+    import re
+    import time
+
+    feed_codes = [str(100000 + i) for i in range(15000)]
+    feed = "".join(
+        f"{code};INF{code}01;INF{code}02;Scheme {code} - Direct - Growth;{10 + int(code) % 97}.1234;17-Oct-2026\r\n"
+        for code in feed_codes
+    ).encode()
+
+    async def chunked():
+        for start in range(0, len(feed), CHUNK_SIZE):
+            yield feed[start:start + CHUNK_SIZE]
+
+    async def run_set(codes: frozenset) -> int:
+        return len([record async for record in parse_nav_stream(chunked(), codes)])
+
+    async def run_regex(pattern: str) -> int:
+        # same as run_set (filter the raw line, parse what is left), only the lookup differs
+        regex = re.compile(pattern)
+        return len([
+            record
+            async for line in iter_lines(chunked())
+            if regex.search(line) and (record := parse_nav_line(line)) is not None
+        ])
+
+    for tracked in (5, 50, 500, 2000):
+        codes = feed_codes[::len(feed_codes) // tracked][:tracked]
+        begin = time.perf_counter()
+        matched_set = asyncio.run(run_set(frozenset(codes)))
+        set_time = time.perf_counter() - begin
+        begin = time.perf_counter()
+        matched_regex = asyncio.run(run_regex("|".join(codes)))
+        regex_time = time.perf_counter() - begin
+        print(
+            f"{tracked:>5} funds: set lookup {set_time * 1000:8.2f} ms ({matched_set} rows) "
+            f"| regex {regex_time * 1000:8.2f} ms ({matched_regex} rows)"
+        )
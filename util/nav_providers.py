@@ -0,0 +1,271 @@
+import asyncio
+import logging
+import os
+import pathlib
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, AsyncIterator, Callable, Optional
+
+import aiohttp
+import numpy as np
+
+from models.nav_date import format_nav_date
+from util.nav_parser import CHUNK_SIZE, iter_response_chunks, parse_nav_line
+
+NAV_OPEN_URL = "https://www.amfiindia.com/spages/navopen.txt"
+NAV_ALL_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
+NAV_HEADER = [
+    "Scheme Code",
+    "ISIN Div Payout/ ISIN Growth",
+    "ISIN Div Reinvestment",
+    "Scheme Name",
+    "Net Asset Value",
+    "Date",
+]
+# comma separated urls of navopen.txt compatible mirrors, raced along with the AMFI endpoints
+MIRRORS_ENV = "NAV_PROVIDER_MIRRORS"
+SCHEMA_PEEK_BYTES = 256 * 1024
+
+
+class NavProviderError(Exception):
+    pass
+
+
+class StaleFeedError(NavProviderError):
+    """
+    a valid feed whose newest NAV is too old, e.g. nothing was published over a long holiday
+    """
+
+    def __init__(self, provider: str, message: str):
+        super().__init__(message)
+        self.provider = provider
+
+
+@dataclass
+class NavFeed:
+    """
+    an opened feed, chunks yields the whole body including whatever was read while validating it
+    """
+    provider: str
+    chunks: Optional[AsyncIterator[bytes]] = None
+    etag: str = ""
+    last_modified: str = ""
+    not_modified: bool = False
+    _close: Callable[[bool], Any] = field(default=lambda abort: None, repr=False)
+
+    def close(self, abort: bool = False) -> None:
+        self._close(abort)
+
+
+class NavProvider(ABC):
+    # a fallback is only opened once every other provider failed
+    fallback = False
+
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    async def open(self, session: aiohttp.ClientSession, headers: dict[str, str]) -> NavFeed:
+        """
+        start the transfer, headers are the conditional request headers meant for this provider
+        """
+
+
+class HttpNavProvider(NavProvider):
+    def __init__(self, name: str, url: str, timeout: Optional[float] = None):
+        """
+        timeout overrides the total timeout of the shared session for this provider
+        """
+        super().__init__(name)
+        self.url = url
+        self.timeout = timeout
+
+    async def open(self, session: aiohttp.ClientSession, headers: dict[str, str]) -> NavFeed:
+        kwargs = {} if self.timeout is None else {"timeout": aiohttp.ClientTimeout(total=self.timeout)}
+        res = await session.get(self.url, headers=headers, **kwargs)
+
+        def close(abort: bool) -> None:
+            res.close() if abort else res.release()
+
+        if res.status == 304:
+            close(False)
+            return NavFeed(provider=self.name, not_modified=True)
+        if res.status != 200:
+            close(True)
+            raise NavProviderError(f"{self.name}: HTTP status: {res.status}")
+        return NavFeed(
+            provider=self.name,
+            chunks=iter_response_chunks(res.content),
+            etag=res.headers.get("ETag", ""),
+            last_modified=res.headers.get("Last-Modified", ""),
+            _close=close,
+        )
+
+
+class LocalFileNavProvider(NavProvider):
+    """
+    a navopen.txt dropped on disk, e.g. fetched by another machine. it has no validators and would
+    win every race, so it is only a fallback for when the network is down
+    """
+    fallback = True
+
+    def __init__(self, name: str, path: str | pathlib.Path):
+        super().__init__(name)
+        self.path = pathlib.Path(path)
+
+    async def open(self, session: aiohttp.ClientSession, headers: dict[str, str]) -> NavFeed:
+        if not self.path.exists():
+            raise NavProviderError(f"{self.name}: {self.path} does not exist")
+        file = open(self.path, "rb")
+
+        async def chunks() -> AsyncIterator[bytes]:
+            while chunk := await asyncio.to_thread(file.read, CHUNK_SIZE):
+                yield chunk
+
+        return NavFeed(provider=self.name, chunks=chunks(), _close=lambda abort: file.close())
+
+
+def get_default_providers(data_path: str | pathlib.Path) -> list[NavProvider]:
+    providers: list[NavProvider] = [
+        HttpNavProvider("navopen", NAV_OPEN_URL),
+        HttpNavProvider("NAVAll", NAV_ALL_URL),
+        LocalFileNavProvider("local", pathlib.Path(data_path).joinpath("navopen.txt")),
+    ]
+    mirrors = os.environ.get(MIRRORS_ENV, "")
+    providers.extend(
+        HttpNavProvider(f"mirror{index}", url.strip())
+        for index, url in enumerate(mirrors.split(","))
+        if url.strip()
+    )
+    return providers
+
+
+async def _prepend(prefix: list[bytes], rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    for chunk in prefix:
+        yield chunk
+    async for chunk in rest:
+        yield chunk
+
+
+async def validate_feed(feed: NavFeed, max_age_days: int, today: datetime, newer_than: int = 0) -> NavFeed:
+    """
+    peek at the start of the body: the header must match the navopen.txt schema and the newest
+    NAV date among the first rows must be at most max_age_days business days (weekdays) old and
+    after newer_than
+    """
+    if feed.not_modified:
+        return feed
+    prefix: list[bytes] = []
+    size = 0
+    async for chunk in feed.chunks:
+        prefix.append(chunk)
+        size += len(chunk)
+        if size >= SCHEMA_PEEK_BYTES:
+            break
+    lines = b"".join(prefix).decode("utf-8", errors="replace").lstrip("\ufeff").splitlines()
+    header = [column.strip() for column in lines[0].split(";")] if lines else []
+    if len(header) != len(NAV_HEADER) or any(
+            header[index] != NAV_HEADER[index] for index in (0, 3, 4, 5)
+    ):
+        raise NavProviderError(f"{feed.provider}: unexpected header {lines[:1]}")
+
+    dates = [record.date for record in map(parse_nav_line, lines[1:-1]) if record is not None]
+    if not dates:
+        raise NavProviderError(f"{feed.provider}: no NAV rows in the feed")
+    newest = max(dates)
+    if np.busday_count(date.fromordinal(newest), today.date()) > max_age_days:
+        raise StaleFeedError(
+            feed.provider, f"{feed.provider}: stale feed, newest NAV is from {format_nav_date(newest)}"
+        )
+    if newest <= newer_than:
+        raise NavProviderError(f"{feed.provider}: no NAV after {format_nav_date(newer_than)}")
+
+    feed.chunks = _prepend(prefix, feed.chunks)
+    return feed
+
+
+async def _open_validated(
+        provider: NavProvider,
+        session: aiohttp.ClientSession,
+        headers: dict[str, str],
+        max_age_days: int,
+        today: datetime,
+        newer_than: int,
+) -> NavFeed:
+    feed = await provider.open(session, headers)
+    try:
+        return await validate_feed(feed, max_age_days, today, newer_than)
+    except BaseException:
+        feed.close(abort=True)
+        raise
+
+
+async def _race(
+        providers: list[NavProvider],
+        session: aiohttp.ClientSession,
+        headers_for: Callable[[NavProvider], dict[str, str]],
+        max_age_days: int,
+        today: datetime,
+        newer_than: int,
+        errors: list[BaseException],
+) -> Optional[NavFeed]:
+    tasks = {
+        asyncio.create_task(
+            _open_validated(provider, session, headers_for(provider), max_age_days, today, newer_than),
+            name=provider.name,
+        )
+        for provider in providers
+    }
+    winner: Optional[NavFeed] = None
+    try:
+        while tasks and winner is None:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    logging.info("NAV provider %s failed: %r", task.get_name(), task.exception())
+                    errors.append(task.exception())
+                elif winner is None:
+                    winner = task.result()
+                else:
+                    task.result().close(abort=True)
+    finally:
+        for task in tasks:
+            task.cancel()
+        losers = await asyncio.gather(*tasks, return_exceptions=True)
+        for loser in losers:
+            if isinstance(loser, NavFeed):
+                loser.close(abort=True)
+    return winner
+
+
+async def race_providers(
+        providers: list[NavProvider],
+        session: aiohttp.ClientSession,
+        headers_for: Callable[[NavProvider], dict[str, str]],
+        max_age_days: int = 4,
+        today: Optional[datetime] = None,
+        newer_than: int = 0,
+) -> NavFeed:
+    """
+    open every provider at once, the first valid and fresh feed wins and the others are cancelled.
+    fallback providers are raced only when all the others failed, and only win with a NAV after
+    newer_than (the newest NAV date already stored). when the only valid feeds are stale nothing
+    new was published (long holidays), that is answered as not modified instead of an error
+    """
+    today = (today or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    errors: list[BaseException] = []
+    primary = [provider for provider in providers if not provider.fallback]
+    fallbacks = [provider for provider in providers if provider.fallback]
+    for group, minimum in ((primary, 0), (fallbacks, newer_than)):
+        if not group:
+            continue
+        winner = await _race(group, session, headers_for, max_age_days, today, minimum, errors)
+        if winner is not None:
+            logging.info("--NAV feed served by %s--", winner.provider)
+            return winner
+    stale = [error for error in errors if isinstance(error, StaleFeedError)]
+    if stale:
+        logging.info("--every valid NAV feed is stale, nothing new published--")
+        return NavFeed(provider=stale[0].provider, not_modified=True)
+    raise NavProviderError(f"all NAV providers failed: {errors}")
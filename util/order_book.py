@@ -0,0 +1,79 @@
+from bisect import bisect_right, insort
+from typing import Iterator, Mapping
+
+from models.nav_date import format_nav_date, to_ordinal
+
+
+class OrderBook:
+    """
+    pending orders of order.json, per fund indexed by order date.
+    settling takes only the orders that are due, a bisect on the sorted dates instead of
+    checking every pending order of the fund on every NAV update
+    """
+
+    def __init__(self):
+        self.dates: dict[str, list[int]] = {}  # sorted day ordinals
+        self.orders: dict[str, dict[int, list]] = {}  # fund -> date -> [units, amount]
+
+    def __contains__(self, fund_id: str) -> bool:
+        return bool(self.dates.get(fund_id))
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        funds with pending orders
+        """
+        return (fund_id for fund_id, dates in self.dates.items() if dates)
+
+    def __len__(self) -> int:
+        return sum(len(dates) for dates in self.dates.values())
+
+    def add(self, fund_id: str, date: int, units: float, amount: float) -> None:
+        orders = self.orders.setdefault(fund_id, {})
+        if date in orders:
+            orders[date][0] += units
+            orders[date][1] += amount
+            return
+        orders[date] = [units, amount]
+        insort(self.dates.setdefault(fund_id, []), date)
+
+    def pending(self, fund_id: str) -> dict[int, list]:
+        return self.orders.get(fund_id, {})
+
+    def pending_units(self, fund_id: str) -> float:
+        return sum(order[0] for order in self.pending(fund_id).values())
+
+    def pop_due(self, fund_id: str, nav_date: int) -> list[tuple[int, list]]:
+        """
+        removes and returns, oldest first, the orders of the fund dated on or before nav_date,
+        i.e. the ones whose units were bought at a NAV that is already published
+        """
+        dates = self.dates.get(fund_id)
+        if not dates or dates[0] > nav_date:
+            return []
+        end = bisect_right(dates, nav_date)
+        orders = self.orders[fund_id]
+        due = [(date, orders.pop(date)) for date in dates[:end]]
+        del dates[:end]
+        return due
+
+    def pop_all(self, fund_id: str) -> list[tuple[int, list]]:
+        dates = self.dates.get(fund_id)
+        return self.pop_due(fund_id, dates[-1]) if dates else []
+
+    def to_json(self) -> dict[str, dict[str, list]]:
+        """
+        order.json layout, keyed by "%d-%b-%Y" dates since the file is edited by hand and by the dashboard
+        """
+        return {
+            fund_id: {format_nav_date(date): self.orders[fund_id][date] for date in dates}
+            for fund_id, dates in self.dates.items()
+            if dates
+        }
+
+    @classmethod
+    def from_json(cls, data: Mapping[str, Mapping[str, list]]) -> "OrderBook":
+        book = cls()
+        for fund_id, orders in data.items():
+            for date, (units, amount) in orders.items():
+                book.add(fund_id, to_ordinal(date), units, amount)
+        return book
@@ -0,0 +1,48 @@
+from datetime import datetime, time, timedelta
+
+
+class PollSchedule:
+    """
+    adaptive polling around AMFI's evening publish window.
+    inside the window the feed is polled every fast_interval seconds, every unchanged poll
+    stretches the interval by backoff_factor up to max_interval and a change resets it,
+    outside the window it sleeps until the window opens again (at most idle_interval at a time)
+    """
+
+    def __init__(
+            self,
+            window_start: time = time(18, 30),
+            window_end: time = time(23, 30),
+            fast_interval: float = 120,
+            max_interval: float = 900,
+            backoff_factor: float = 1.5,
+            idle_interval: float = 3600,
+    ):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.backoff_factor = backoff_factor
+        self.idle_interval = idle_interval
+        self.interval = fast_interval
+
+    def in_window(self, now: datetime) -> bool:
+        return self.window_start <= now.time() <= self.window_end
+
+    def seconds_until_window(self, now: datetime) -> float:
+        start = now.replace(
+            hour=self.window_start.hour, minute=self.window_start.minute, second=0, microsecond=0
+        )
+        if start <= now:
+            start += timedelta(days=1)
+        return (start - now).total_seconds()
+
+    def next_delay(self, now: datetime, changed: bool) -> float:
+        if changed:
+            self.interval = self.fast_interval
+        else:
+            self.interval = min(self.interval * self.backoff_factor, self.max_interval)
+        if self.in_window(now):
+            return self.interval
+        self.interval = self.fast_interval
+        return min(self.seconds_until_window(now), self.idle_interval)
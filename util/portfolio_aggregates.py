@@ -0,0 +1,71 @@
+import logging
+from typing import Collection, NamedTuple, Optional
+
+from models.day_change import InvestmentData, NavData
+
+TOLERANCE = 0.01  # rupees, the stored figures are rounded to 3 decimals on every update
+
+
+class FundContribution(NamedTuple):
+    current: float = 0
+    invested: float = 0
+    dayChange: float = 0  # 0 when the fund has no day change (-1 in NavData)
+
+
+def contribution(fund: Optional[NavData]) -> FundContribution:
+    if fund is None:
+        return FundContribution()
+    return FundContribution(fund.current, fund.invested, 0 if fund.dayChange == -1 else fund.dayChange)
+
+
+def refresh_derived_totals(data: InvestmentData) -> None:
+    data.totalProfit = round(data.sumTotal - data.totalInvested, 3)
+    data.totalProfitPercentage = (
+        round(data.totalProfit / data.totalInvested * 100, 3) if data.totalInvested else 0
+    )
+
+
+def apply_fund_delta(data: InvestmentData, before: FundContribution, after: FundContribution) -> None:
+    """
+    move the portfolio totals by the change of one fund, O(1) however many funds are tracked
+    """
+    data.sumTotal = round(data.sumTotal + after.current - before.current, 3)
+    data.totalInvested = round(data.totalInvested + after.invested - before.invested, 3)
+    data.totalDaychange = round(data.totalDaychange + after.dayChange - before.dayChange, 3)
+    refresh_derived_totals(data)
+
+
+def recompute_totals(data: InvestmentData, scheme_codes: Collection[str]) -> FundContribution:
+    """
+    the totals from scratch, over the held funds (scheme_codes, the units.json keys). a fund removed
+    from units.json still has its history in the file but no longer counts
+    """
+    funds = [contribution(data.funds.get(scheme_code)) for scheme_code in scheme_codes]
+    return FundContribution(
+        round(sum(fund.current for fund in funds), 3),
+        round(sum(fund.invested for fund in funds), 3),
+        round(sum(fund.dayChange for fund in funds), 3),
+    )
+
+
+def check_aggregates(data: InvestmentData, scheme_codes: Collection[str], repair: bool = False) -> list[str]:
+    """
+    compares the running totals with a full recompute, returns the mismatches (empty when consistent).
+    with repair the recomputed totals replace the stored ones
+    """
+    expected = recompute_totals(data, scheme_codes)
+    stored = FundContribution(data.sumTotal, data.totalInvested, data.totalDaychange)
+    mismatches = [
+        f"{name}: stored {stored_value}, recomputed {expected_value}"
+        for name, stored_value, expected_value in zip(
+            ("sumTotal", "totalInvested", "totalDaychange"), stored, expected
+        )
+        if abs(stored_value - expected_value) > TOLERANCE
+    ]
+    for mismatch in mismatches:
+        logging.warning("aggregate mismatch %s", mismatch)
+    if mismatches and repair:
+        data.sumTotal, data.totalInvested, data.totalDaychange = expected
+        refresh_derived_totals(data)
+        logging.info("--portfolio totals repaired from a full recompute--")
+    return mismatches
@@ -0,0 +1,110 @@
+import math
+from typing import Optional
+
+import numpy as np
+
+from models.fund_metrics import FundMetrics
+from models.nav_series import NavSeries
+
+TRADING_DAYS = 252
+RISK_FREE_RATE = 0.065  # annual, roughly the 91 day T-bill yield
+TRAILING_PERIODS = {"1M": 30, "3M": 91, "6M": 182, "1Y": 365, "3Y": 3 * 365, "5Y": 5 * 365}
+
+
+def trailing_return(nav: NavSeries, date: int, days: int) -> Optional[float]:
+    """
+    percent change of the NAV over the period ending on date, annualized for periods longer than a year.
+    None when the history doesn't reach back that far
+    """
+    start, end = nav.on_or_before(date - days), nav.on_or_before(date)
+    if start is None or end is None or start[1] <= 0:
+        return None
+    growth = end[1] / start[1]
+    if days > 365:
+        growth **= 365 / (end[0] - start[0])
+    return round((growth - 1) * 100, 3)
+
+
+def _refresh(metrics: FundMetrics, nav: NavSeries) -> FundMetrics:
+    """
+    the reported figures from the running aggregates, trailing returns are a few bisects on the history
+    """
+    metrics.trailingReturns = {
+        period: trailing_return(nav, metrics.lastDate, days) for period, days in TRAILING_PERIODS.items()
+    }
+    if metrics.count > 1:
+        daily_std = math.sqrt(metrics.m2 / (metrics.count - 1))
+        metrics.volatility = round(daily_std * math.sqrt(TRADING_DAYS) * 100, 3)
+        annual_std = daily_std * math.sqrt(TRADING_DAYS)
+        excess = metrics.meanReturn * TRADING_DAYS - math.log1p(RISK_FREE_RATE)
+        metrics.sharpe = round(excess / annual_std, 3) if annual_std > 0 else None
+    else:
+        metrics.volatility = metrics.sharpe = None
+    return metrics
+
+
+def rebuild_metrics(nav: NavSeries) -> FundMetrics:
+    """
+    all aggregates from the full history, for funds without metrics yet or whose history was rewritten
+    """
+    metrics = FundMetrics()
+    dates, navs = nav.as_numpy()
+    if not len(navs):
+        return metrics
+    returns = np.diff(np.log(navs))
+    peaks = np.maximum.accumulate(navs)
+    metrics.lastDate, metrics.lastNav = int(dates[-1]), float(navs[-1])
+    metrics.count = len(returns)
+    metrics.meanReturn = float(returns.mean()) if len(returns) else 0.0
+    metrics.m2 = float(((returns - metrics.meanReturn) ** 2).sum())
+    metrics.peakNav = float(peaks[-1])
+    metrics.maxDrawdown = float(((1 - navs / peaks) * 100).max())
+    return _refresh(metrics, nav)
+
+
+def update_metrics(metrics: FundMetrics, nav: NavSeries) -> FundMetrics:
+    """
+    fold the latest NAV of the history into the aggregates in O(1) (welford for the volatility,
+    running peak for the drawdown). anything but a plain append after the last folded NAV
+    (a correction, a back dated or back filled NAV) rebuilds from the history instead
+    """
+    latest = nav.latest()
+    if latest is None:
+        return FundMetrics()
+    date, value = latest
+    if date == metrics.lastDate and value == metrics.lastNav:
+        return metrics
+    previous = nav.before(date)
+    if not metrics.lastDate or previous is None or previous != (metrics.lastDate, metrics.lastNav):
+        return rebuild_metrics(nav)
+
+    daily_return = math.log(value / metrics.lastNav)
+    metrics.count += 1
+    delta = daily_return - metrics.meanReturn
+    metrics.meanReturn += delta / metrics.count
+    metrics.m2 += delta * (daily_return - metrics.meanReturn)
+    metrics.peakNav = max(metrics.peakNav, value)
+    metrics.maxDrawdown = max(metrics.maxDrawdown, (1 - value / metrics.peakNav) * 100)
+    metrics.lastDate, metrics.lastNav = date, value
+    return _refresh(metrics, nav)
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(0)
+    days = 5 * TRADING_DAYS
+    series = NavSeries(range(730000, 730000 + days), 10 * np.exp(np.cumsum(rng.normal(0.0004, 0.01, days))))
+
+    begin = time.perf_counter()
+    rebuilt = rebuild_metrics(series)
+    print(f"rebuild over {days} NAVs: {(time.perf_counter() - begin) * 1000:.3f} ms")
+
+    incremental = rebuild_metrics(NavSeries(series.dates[:-1], series.navs[:-1]))
+    begin = time.perf_counter()
+    incremental = update_metrics(incremental, series)
+    print(f"incremental update: {(time.perf_counter() - begin) * 1000:.3f} ms")
+    assert incremental.trailingReturns == rebuilt.trailingReturns
+    assert math.isclose(incremental.m2, rebuilt.m2, rel_tol=1e-9)
+    assert math.isclose(incremental.maxDrawdown, rebuilt.maxDrawdown)
+    print(rebuilt)
@@ -0,0 +1,207 @@
+import logging
+import os
+import pathlib
+import tempfile
+from dataclasses import dataclass
+from typing import AsyncIterable, Iterable, Optional
+
+import ujson as json
+
+from util.nav_parser import iter_lines
+
+INDEX_VERSION = 1
+SCHEME_INDEX_FILE_NAME = "scheme_index.json"
+
+
+@dataclass(slots=True)
+class SchemeInfo:
+    code: str
+    name: str
+    isin: str
+    amc: str
+    category: str
+
+
+class SchemeIndexBuilder:
+    """
+    collects every scheme of a navopen.txt snapshot, the AMC and category are taken
+    from the section lines that precede the scheme rows in the feed
+    """
+
+    def __init__(self):
+        self.codes: list[str] = []
+        self.names: list[str] = []
+        self.isins: list[str] = []
+        self.amc: list[int] = []
+        self.category: list[int] = []
+        self.amcs: dict[str, int] = {}
+        self.categories: dict[str, int] = {}
+        self.current_amc = self._intern(self.amcs, "")
+        self.current_category = self._intern(self.categories, "")
+
+    @staticmethod
+    def _intern(table: dict[str, int], value: str) -> int:
+        return table.setdefault(value, len(table))
+
+    def feed_line(self, line: str) -> None:
+        line = line.strip()
+        if not line or line.startswith("Scheme Code"):
+            return
+        if not line[0].isdigit():
+            if "Schemes" in line and "(" in line:
+                # e.g. Open Ended Schemes(Debt Scheme - Banking and PSU Fund)
+                start, end = line.index("(") + 1, line.rfind(")")
+                self.current_category = self._intern(
+                    self.categories, line[start:end if end >= start else None].strip()
+                )
+            else:
+                self.current_amc = self._intern(self.amcs, line)
+            return
+        parts = line.split(";")
+        if len(parts) < 4:
+            return
+        self.codes.append(parts[0])
+        self.isins.append(parts[1] if parts[1] != "-" else parts[2])
+        self.names.append(parts[3].strip())
+        self.amc.append(self.current_amc)
+        self.category.append(self.current_category)
+
+    def build(self, snapshot_hash: str) -> "SchemeIndex":
+        return SchemeIndex(
+            snapshot_hash=snapshot_hash,
+            codes=self.codes,
+            names=self.names,
+            isins=self.isins,
+            amc=self.amc,
+            category=self.category,
+            amcs=list(self.amcs),
+            categories=list(self.categories),
+        )
+
+
+class SchemeIndex:
+    """
+    code, name, ISIN, AMC and category of every scheme in the AMFI universe, stored column wise with
+    AMC and category dictionary encoded so the whole index loads with a single json parse
+    """
+
+    def __init__(
+            self,
+            snapshot_hash: str,
+            codes: list[str],
+            names: list[str],
+            isins: list[str],
+            amc: list[int],
+            category: list[int],
+            amcs: list[str],
+            categories: list[str],
+    ):
+        self.snapshot_hash = snapshot_hash
+        self.codes = codes
+        self.names = names
+        self.isins = isins
+        self.amc = amc
+        self.category = category
+        self.amcs = amcs
+        self.categories = categories
+        self._positions: Optional[dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @property
+    def positions(self) -> dict[str, int]:
+        if self._positions is None:
+            self._positions = {code: index for index, code in enumerate(self.codes)}
+        return self._positions
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.positions
+
+    def get(self, code: str) -> Optional[SchemeInfo]:
+        index = self.positions.get(code)
+        if index is None:
+            return None
+        return SchemeInfo(
+            code=code,
+            name=self.names[index],
+            isin=self.isins[index],
+            amc=self.amcs[self.amc[index]],
+            category=self.categories[self.category[index]],
+        )
+
+    def name_of(self, code: str, default: str = "") -> str:
+        index = self.positions.get(code)
+        return default if index is None else self.names[index]
+
+    def name_to_code(self) -> dict[str, str]:
+        return dict(zip(self.names, self.codes))
+
+    def save(self, path: str | pathlib.Path) -> None:
+        path = pathlib.Path(path)
+        data = {
+            "version": INDEX_VERSION,
+            "hash": self.snapshot_hash,
+            "codes": self.codes,
+            "names": self.names,
+            "isins": self.isins,
+            "amc": self.amc,
+            "category": self.category,
+            "amcs": self.amcs,
+            "categories": self.categories,
+        }
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(temp_name, path)
+        logging.info("saved scheme index of %s schemes for snapshot %s", len(self), self.snapshot_hash)
+
+    @classmethod
+    def load(cls, path: str | pathlib.Path) -> Optional["SchemeIndex"]:
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION:
+            return None
+        return cls(
+            snapshot_hash=data["hash"],
+            codes=data["codes"],
+            names=data["names"],
+            isins=data["isins"],
+            amc=data["amc"],
+            category=data["category"],
+            amcs=data["amcs"],
+            categories=data["categories"],
+        )
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str], snapshot_hash: str) -> "SchemeIndex":
+        builder = SchemeIndexBuilder()
+        for line in lines:
+            builder.feed_line(line)
+        return builder.build(snapshot_hash)
+
+    @classmethod
+    async def from_chunks(cls, chunks: AsyncIterable[bytes], snapshot_hash: str) -> "SchemeIndex":
+        builder = SchemeIndexBuilder()
+        async for line in iter_lines(chunks):
+            builder.feed_line(line)
+        return builder.build(snapshot_hash)
+
+
+async def ensure_scheme_index(
+        path: str | pathlib.Path, archive, snapshot_hash: str
+) -> Optional[SchemeIndex]:
+    """
+    load the persisted index, rebuilding it from the archived snapshot only when the snapshot hash changed
+    """
+    index = SchemeIndex.load(path)
+    if index is not None and (not snapshot_hash or index.snapshot_hash == snapshot_hash):
+        return index
+    if snapshot_hash and snapshot_hash in archive:
+        logging.info("--rebuilding scheme index for snapshot %s--", snapshot_hash)
+        index = await SchemeIndex.from_chunks(archive.iter_chunks(snapshot_hash), snapshot_hash)
+        index.save(path)
+    return index
@@ -0,0 +1,177 @@
+import logging
+import os
+import pathlib
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Optional
+
+import msgspec
+import ujson as json
+
+from models.day_change import (
+    InvestmentData,
+    decode_hook,
+    encode_hook,
+    get_investment_data,
+    investment_data_to_dict,
+)
+
+FORMAT_VERSION = 1
+HEADER_PREFIX = b"#MF "
+# per file format as "file=format" pairs separated by commas, e.g. "dayChange.json=msgpack"
+FORMATS_ENV = "MF_FILE_FORMATS"
+# machine owned files are stored compact, the rest stays indented json for hand editing
+DEFAULT_FILE_FORMATS = {
+    "dayChange.json": "json-compact",
+    "dayChange_bkc.json": "json-compact",
+    "order_history.json": "json-compact",
+    "lots.json": "json-compact",
+}
+# how the models are built from plain data when msgspec can't validate a file
+FROM_BUILTINS: dict[type, Callable[[Any], Any]] = {InvestmentData: get_investment_data}
+
+
+class Serializer(ABC):
+    """
+    dumps takes plain data or a model (InvestmentData), a model is encoded field by field
+    without being copied into dicts first
+    """
+    name: str
+
+    @abstractmethod
+    def dumps(self, data: Any) -> bytes:
+        pass
+
+    @abstractmethod
+    def loads(self, body: bytes) -> Any:
+        pass
+
+    @abstractmethod
+    def _decode_typed(self, body: bytes, type_: type) -> Any:
+        pass
+
+    def decode(self, body: bytes, type_: type) -> Any:
+        """
+        straight from the bytes into type_, validating on the way (msgspec). files msgspec can't
+        validate (e.g. legacy "%d-%b-%Y" dates) go through plain data instead
+        """
+        try:
+            return self._decode_typed(body, type_)
+        except msgspec.ValidationError as error:
+            logging.info("--typed decoding failed (%s), decoding untyped--", error)
+        return FROM_BUILTINS[type_](self.loads(body))
+
+
+class JsonSerializer(Serializer):
+    def __init__(self, name: str, indent: int = 0):
+        self.name = name
+        self.indent = indent
+
+    def dumps(self, data: Any) -> bytes:
+        body = msgspec.json.encode(data, enc_hook=encode_hook)
+        return msgspec.json.format(body, indent=self.indent) if self.indent else body
+
+    def loads(self, body: bytes) -> Any:
+        return json.loads(body)
+
+    def _decode_typed(self, body: bytes, type_: type) -> Any:
+        return msgspec.json.decode(body, type=type_, dec_hook=decode_hook)
+
+
+class MsgpackSerializer(Serializer):
+    name = "msgpack"
+
+    def dumps(self, data: Any) -> bytes:
+        return msgspec.msgpack.encode(data, enc_hook=encode_hook)
+
+    def loads(self, body: bytes) -> Any:
+        return msgspec.msgpack.decode(body)
+
+    def _decode_typed(self, body: bytes, type_: type) -> Any:
+        return msgspec.msgpack.decode(body, type=type_, dec_hook=decode_hook)
+
+
+SERIALIZERS: dict[str, Serializer] = {
+    "json": JsonSerializer("json", indent=4),
+    "json-compact": JsonSerializer("json-compact"),
+    "msgpack": MsgpackSerializer(),
+}
+
+
+def file_formats() -> dict[str, str]:
+    formats = dict(DEFAULT_FILE_FORMATS)
+    for pair in os.environ.get(FORMATS_ENV, "").split(","):
+        if "=" in pair:
+            file_name, name = pair.split("=", 1)
+            formats[file_name.strip()] = name.strip()
+    return formats
+
+
+def get_serializer(name: str) -> Serializer:
+    if name not in SERIALIZERS:
+        raise ValueError(f"no serializer {name}, one of {', '.join(SERIALIZERS)}")
+    return SERIALIZERS[name]
+
+
+def serializer_for(path: str | pathlib.Path) -> Serializer:
+    return get_serializer(file_formats().get(pathlib.Path(path).name, "json"))
+
+
+def dumps(data: Any, serializer: Serializer) -> bytes:
+    """
+    every format but the indented json gets a "#MF <format> <version>" first line, indented json
+    stays a plain json file since units.json / order.json are edited by hand
+    """
+    body = serializer.dumps(data)
+    if serializer.name == "json":
+        return body
+    return HEADER_PREFIX + f"{serializer.name} {FORMAT_VERSION}\n".encode() + body
+
+
+def loads(content: bytes, type_: Optional[type] = None) -> Any:
+    """
+    the format is taken from the header line, a file without one is json.
+    with type_ the content is decoded into that model (see Serializer.decode)
+    """
+    serializer, body = SERIALIZERS["json"], content
+    if content.startswith(HEADER_PREFIX):
+        header, _, body = content.partition(b"\n")
+        name, version = header[len(HEADER_PREFIX):].decode().split()
+        if int(version) > FORMAT_VERSION:
+            raise ValueError(f"format version {version} is newer than {FORMAT_VERSION}")
+        serializer = get_serializer(name)
+    return serializer.loads(body) if type_ is None else serializer.decode(body, type_)
+
+
+def dump_file(path: str | pathlib.Path, data: Any) -> None:
+    with open(path, "wb") as file:
+        file.write(dumps(data, serializer_for(path)))
+
+
+def load_file(path: str | pathlib.Path) -> Any:
+    with open(path, "rb") as file:
+        return loads(file.read())
+
+
+if __name__ == "__main__":
+    import time
+
+    from util.benchmark_data import sample_investment_data
+
+    sample = sample_investment_data()
+
+    def timed(function: Callable[[], Any]) -> tuple[Any, float]:
+        begin = time.perf_counter()
+        result = function()
+        return result, (time.perf_counter() - begin) * 1000
+
+    for serializer in SERIALIZERS.values():
+        content, dict_dump = timed(lambda: dumps(investment_data_to_dict(sample), serializer))
+        typed_content, typed_dump = timed(lambda: dumps(sample, serializer))
+        untyped, dict_load = timed(lambda: get_investment_data(loads(content)))
+        typed, typed_load = timed(lambda: loads(typed_content, InvestmentData))
+        assert untyped == typed == sample
+        print(
+            f"{serializer.name:>12}: {len(content) / 1024:9.1f} KiB, "
+            f"dump {dict_dump:7.2f} ms (typed {typed_dump:7.2f} ms), "
+            f"load {dict_load:7.2f} ms (typed {typed_load:7.2f} ms)"
+        )
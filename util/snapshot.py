@@ -0,0 +1,220 @@
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import tempfile
+from array import array
+from collections.abc import MutableMapping
+from typing import Iterator, Optional
+
+import ujson as json
+
+from models.day_change import InvestmentData, NavData, get_nav_data, investment_data_to_dict, nav_data_to_dict
+from models.nav_series import NavSeries
+
+SNAPSHOT_FILE_NAME = "dayChange.snapshot"
+MAGIC = b"MFSNAP\x00\x00"
+VERSION = 1
+# magic, version, reserved, fund count, size and mtime (ns) of the dayChange.json it was built from,
+# NAV count, then the offsets of the portfolio JSON, the fund table, the dates array and the navs array
+HEADER = struct.Struct("<8sHHIQQQQQQQ")
+# scheme code, first NAV index, NAV count, offset and length of the JSON with the other fields
+FUND = struct.Struct("<16sQIQI")
+
+
+def _align(offset: int, size: int = 8) -> int:
+    return -(-offset // size) * size
+
+
+def source_signature(path: str | pathlib.Path) -> tuple[int, int]:
+    """
+    size and mtime of the file, checked without reading it
+    """
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def write_snapshot(path: str | pathlib.Path, data: InvestmentData, source: tuple[int, int]) -> None:
+    """
+    source: source_signature of the dayChange.json holding the same state, a snapshot is only used
+    while the file still has it.
+    written next to the target and moved over it, so a reader maps either the old or the new file
+    """
+    path = pathlib.Path(path)
+    portfolio = json.dumps(investment_data_to_dict(data, with_funds=False)).encode()
+    funds = list(data.funds.items())
+    metas = [json.dumps(nav_data_to_dict(fund, with_nav=False)).encode() for _, fund in funds]
+    nav_count = sum(len(fund.nav) for _, fund in funds)
+
+    portfolio_offset = HEADER.size
+    funds_offset = portfolio_offset + len(portfolio)
+    meta_offset = funds_offset + FUND.size * len(funds)
+    dates_offset = _align(meta_offset + sum(len(meta) for meta in metas))
+    navs_offset = _align(dates_offset + 4 * nav_count)
+
+    buffer = bytearray(navs_offset + 8 * nav_count)
+    HEADER.pack_into(
+        buffer, 0, MAGIC, VERSION, 0, len(funds), *source, nav_count,
+        portfolio_offset, funds_offset, dates_offset, navs_offset,
+    )
+    buffer[portfolio_offset:funds_offset] = portfolio
+    first = 0
+    for index, ((scheme_code, fund), meta) in enumerate(zip(funds, metas)):
+        FUND.pack_into(
+            buffer, funds_offset + index * FUND.size, scheme_code.encode(), first, len(fund.nav),
+            meta_offset, len(meta),
+        )
+        buffer[meta_offset:meta_offset + len(meta)] = meta
+        meta_offset += len(meta)
+        buffer[dates_offset + 4 * first:dates_offset + 4 * (first + len(fund.nav))] = fund.nav.dates.tobytes()
+        buffer[navs_offset + 8 * first:navs_offset + 8 * (first + len(fund.nav))] = fund.nav.navs.tobytes()
+        first += len(fund.nav)
+
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".part")
+    with os.fdopen(fd, "wb") as file:
+        file.write(buffer)
+    os.replace(temp_name, path)
+    logging.info("--wrote snapshot of %s funds, %s NAVs to %s--", len(funds), nav_count, path)
+
+
+class InvestmentSnapshot:
+    """
+    a memory mapped snapshot: the header and fund table are read on open, a fund's other fields and
+    its NAV history only when the fund is accessed. close it before the file is replaced, Windows
+    can't replace a mapped file
+    """
+
+    def __init__(self, buffer: mmap.mmap):
+        self.buffer = buffer
+        (
+            _, _, _, fund_count, source_size, source_mtime, self.nav_count,
+            self.portfolio_offset, self.funds_offset, self.dates_offset, self.navs_offset,
+        ) = HEADER.unpack_from(buffer, 0)
+        self.source = (source_size, source_mtime)
+        self.index: dict[str, int] = {}
+        for position in range(fund_count):
+            scheme_code = FUND.unpack_from(buffer, self.funds_offset + position * FUND.size)[0]
+            self.index[scheme_code.rstrip(b"\x00").decode()] = position
+
+    @classmethod
+    def open(cls, path: str | pathlib.Path) -> Optional["InvestmentSnapshot"]:
+        """
+        None when there is no snapshot or it was written in another format
+        """
+        try:
+            with open(path, "rb") as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return None
+        if len(buffer) < HEADER.size or HEADER.unpack_from(buffer, 0)[:2] != (MAGIC, VERSION):
+            buffer.close()
+            return None
+        return cls(buffer)
+
+    def close(self) -> None:
+        self.buffer.close()
+
+    def __enter__(self) -> "InvestmentSnapshot":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _record(self, scheme_code: str) -> tuple:
+        return FUND.unpack_from(self.buffer, self.funds_offset + self.index[scheme_code] * FUND.size)
+
+    def portfolio(self) -> dict:
+        return json.loads(self.buffer[self.portfolio_offset:self.funds_offset])
+
+    def nav(self, scheme_code: str) -> NavSeries:
+        """
+        the fund's history as a NavSeries of its own (a copy of just that slice), free to grow
+        """
+        _, first, count, _, _ = self._record(scheme_code)
+        nav = NavSeries()
+        nav.dates = array("i", self.buffer[self.dates_offset + 4 * first:self.dates_offset + 4 * (first + count)])
+        nav.navs = array("d", self.buffer[self.navs_offset + 8 * first:self.navs_offset + 8 * (first + count)])
+        return nav
+
+    def fund(self, scheme_code: str) -> NavData:
+        _, _, _, meta_offset, meta_length = self._record(scheme_code)
+        fund_data = json.loads(self.buffer[meta_offset:meta_offset + meta_length])
+        fund_data["nav"] = self.nav(scheme_code)
+        return get_nav_data(fund_data)
+
+    def investment_data(self) -> InvestmentData:
+        data = InvestmentData(**self.portfolio())
+        data.funds = SnapshotFunds(self)  # type: ignore
+        return data
+
+
+class SnapshotFunds(MutableMapping):
+    """
+    InvestmentData.funds backed by a snapshot, a fund is decoded the first time it is accessed and
+    from then on lives in memory like any other NavData
+    """
+
+    def __init__(self, snapshot: InvestmentSnapshot):
+        self.snapshot = snapshot
+        self.loaded: dict[str, NavData] = {}
+        self.keys_: dict[str, None] = dict.fromkeys(snapshot.index)  # insertion ordered, like the file
+
+    def detach(self) -> None:
+        """
+        decode the funds not accessed yet, after that the snapshot can be closed
+        """
+        for scheme_code in self.keys_:
+            self[scheme_code]
+
+    def __getitem__(self, scheme_code: str) -> NavData:
+        if scheme_code not in self.loaded:
+            if scheme_code not in self.keys_:
+                raise KeyError(scheme_code)
+            self.loaded[scheme_code] = self.snapshot.fund(scheme_code)
+        return self.loaded[scheme_code]
+
+    def __setitem__(self, scheme_code: str, fund: NavData) -> None:
+        self.keys_[scheme_code] = None
+        self.loaded[scheme_code] = fund
+
+    def __delitem__(self, scheme_code: str) -> None:
+        del self.keys_[scheme_code]
+        self.loaded.pop(scheme_code, None)
+
+    def __contains__(self, scheme_code) -> bool:
+        return scheme_code in self.keys_
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self.keys_))
+
+    def __len__(self) -> int:
+        return len(self.keys_)
+
+
+if __name__ == "__main__":
+    import time
+
+    from models.day_change import get_investment_data
+    from util.benchmark_data import sample_investment_data
+
+    sample = sample_investment_data()
+    with tempfile.TemporaryDirectory() as folder:
+        json_path, snapshot_path = pathlib.Path(folder, "dayChange.json"), pathlib.Path(folder, SNAPSHOT_FILE_NAME)
+        json_path.write_text(json.dumps(investment_data_to_dict(sample)))
+        write_snapshot(snapshot_path, sample, source_signature(json_path))
+
+        begin = time.perf_counter()
+        parsed = get_investment_data(json.loads(json_path.read_text()))
+        print(f"json parse of {json_path.stat().st_size} bytes: {(time.perf_counter() - begin) * 1000:.3f} ms")
+
+        begin = time.perf_counter()
+        snapshot = InvestmentSnapshot.open(snapshot_path)
+        assert snapshot is not None and snapshot.source == source_signature(json_path)
+        mapped = snapshot.investment_data()
+        print(f"snapshot open, {len(mapped.funds)} funds indexed: {(time.perf_counter() - begin) * 1000:.3f} ms")
+
+        begin = time.perf_counter()
+        assert all(mapped.funds[code].nav == parsed.funds[code].nav for code in parsed.funds)
+        print(f"every fund decoded from the snapshot: {(time.perf_counter() - begin) * 1000:.3f} ms")
+        snapshot.close()
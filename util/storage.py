@@ -0,0 +1,477 @@
+import asyncio
+import logging
+import os
+import pathlib
+import sqlite3
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from itertools import groupby
+from typing import Any, Awaitable, Callable, Iterable, NamedTuple, Optional
+
+import ujson as json
+
+from models.day_change import (
+    InvestmentData,
+    get_investment_data,
+    get_nav_data,
+    investment_data_to_dict,
+    nav_data_to_dict,
+)
+from models.nav_date import format_nav_date, to_ordinal
+from models.nav_series import NavSeries
+from util.serializer import load_file, loads
+from util.snapshot import SNAPSHOT_FILE_NAME, InvestmentSnapshot, SnapshotFunds, source_signature, write_snapshot
+from util.write_behind import WriteBehind
+
+# "json" (default) keeps units.json / order.json / dayChange.json, "sqlite" keeps them in SQLITE_FILE_NAME
+STORAGE_ENV = "MF_STORAGE"
+SQLITE_FILE_NAME = "tracker.db"
+MIGRATED_KEY = "migrated"  # meta row written in the same transaction as the imported data
+
+Downloader = Callable[[pathlib.Path], Awaitable[None]]  # brings the local copy of a data file up to date
+Units = dict[str, list]
+Orders = dict[str, dict[str, list]]  # order.json layout, keyed by "%d-%b-%Y" dates
+
+
+class ExternalChanges(NamedTuple):
+    """
+    data written by another process (e.g. -add, -backfill, -check repair), None when unchanged
+    """
+    units: Optional[Units] = None
+    orders: Optional[Orders] = None
+    investment_data: Optional[InvestmentData] = None
+
+
+def _resolve(data: Any | Callable[[], Any]) -> Any:
+    return data() if callable(data) else data
+
+
+class Storage(ABC):
+    """
+    where the units, the pending orders and the dayChange state live.
+    saves are deferred like the WriteBehind writes, per kind the last one wins and flush persists them
+    """
+
+    @abstractmethod
+    async def load_units(self) -> Units:
+        pass
+
+    @abstractmethod
+    async def load_orders(self) -> Orders:
+        pass
+
+    @abstractmethod
+    async def load_investment_data(self) -> InvestmentData:
+        pass
+
+    @abstractmethod
+    def save_units(self, units: Units | Callable[[], Units]) -> None:
+        pass
+
+    @abstractmethod
+    def save_orders(self, orders: Orders | Callable[[], Orders]) -> None:
+        pass
+
+    @abstractmethod
+    def save_investment_data(self, data: InvestmentData) -> None:
+        pass
+
+    def resync_nav(self, fund_ids: Iterable[str]) -> None:
+        """
+        histories that changed before their last date (back filled), not only appended to
+        """
+
+    async def backup(self) -> None:
+        """
+        keep a copy of the dayChange state before it is recomputed
+        """
+
+    @abstractmethod
+    def external_changes(self) -> ExternalChanges:
+        """
+        what another process wrote since the last call
+        """
+
+    @abstractmethod
+    async def flush(self) -> None:
+        pass
+
+    @abstractmethod
+    def discard(self) -> None:
+        pass
+
+
+class JsonStorage(Storage):
+    """
+    the JSON files of the data folder, written through the shared WriteBehind.
+    dayChange.json is also kept as a memory mapped snapshot, loaded instead of the JSON while the
+    file keeps the size and mtime the snapshot was built from, so a start doesn't read the JSON at all
+    """
+
+    def __init__(self, data_path: str | pathlib.Path, download: Downloader, writes: WriteBehind):
+        data_path = pathlib.Path(data_path)
+        self.units_file = data_path.joinpath("units.json")
+        self.order_file = data_path.joinpath("order.json")
+        self.day_change_file = data_path.joinpath("dayChange.json")
+        self.backup_file = data_path.joinpath("dayChange_bkc.json")
+        self.snapshot_file = data_path.joinpath(SNAPSHOT_FILE_NAME)
+        self.download = download
+        self.writes = writes
+        self.investment_data: Optional[InvestmentData] = None
+        self.mtimes: dict[pathlib.Path, float] = {}
+        # the mapped snapshot the loaded funds are read from, closed before the file is replaced
+        self.snapshot: Optional[InvestmentSnapshot] = None
+        self.snapshot_funds: Optional[SnapshotFunds] = None
+
+    async def read(self, path: pathlib.Path) -> Any:
+        await self.download(path)
+        return load_file(path)
+
+    async def load_units(self) -> Units:
+        return await self.read(self.units_file)
+
+    async def load_orders(self) -> Orders:
+        return await self.read(self.order_file)
+
+    async def load_investment_data(self) -> InvestmentData:
+        await self.download(self.day_change_file)
+        # taken before reading, a write in between leaves a snapshot that no longer matches
+        source = source_signature(self.day_change_file)
+        self._release_snapshot()
+        snapshot = InvestmentSnapshot.open(self.snapshot_file)
+        if snapshot is not None and snapshot.source == source:
+            logging.info("--loaded %s from its snapshot--", self.day_change_file)
+            data = snapshot.investment_data()
+            self.snapshot, self.snapshot_funds = snapshot, data.funds  # type: ignore
+            return data
+        if snapshot is not None:
+            snapshot.close()
+        data = loads(self.day_change_file.read_bytes(), InvestmentData)
+        write_snapshot(self.snapshot_file, data, source)
+        return data
+
+    def _release_snapshot(self) -> None:
+        """
+        the funds still read from the mapped snapshot are decoded and the mapping is closed
+        """
+        if self.snapshot is None:
+            return
+        self.snapshot_funds.detach()
+        self.snapshot.close()
+        self.snapshot = self.snapshot_funds = None
+
+    def save_units(self, units: Units | Callable[[], Units]) -> None:
+        self.writes.write(self.units_file, units)
+
+    def save_orders(self, orders: Orders | Callable[[], Orders]) -> None:
+        self.writes.write(self.order_file, orders)
+
+    def save_investment_data(self, data: InvestmentData) -> None:
+        self.investment_data = data
+        self.writes.write(self.day_change_file, data)
+
+    async def backup(self) -> None:
+        self.writes.write(self.backup_file, await self.read(self.day_change_file))
+
+    def _mtime(self, path: pathlib.Path) -> float:
+        return path.stat().st_mtime if path.exists() else 0
+
+    def _remember_mtimes(self) -> None:
+        for path in (self.units_file, self.order_file, self.day_change_file):
+            self.mtimes[path] = self._mtime(path)
+
+    def external_changes(self) -> ExternalChanges:
+        changed = []
+        for path in (self.units_file, self.order_file, self.day_change_file):
+            mtime = self._mtime(path)
+            if self.mtimes.get(path, mtime) != mtime:
+                logging.info("--reloading modified %s--", path)
+                changed.append(loads(path.read_bytes(), InvestmentData if path == self.day_change_file else None))
+            else:
+                changed.append(None)
+        self._remember_mtimes()
+        return ExternalChanges(*changed)
+
+    async def flush(self) -> None:
+        data = self.investment_data if self.day_change_file in self.writes.pending else None
+        await self.writes.flush()
+        self._remember_mtimes()
+        self.investment_data = None
+        if data is not None and self.day_change_file.exists():
+            self._release_snapshot()
+            write_snapshot(self.snapshot_file, data, source_signature(self.day_change_file))
+
+    def discard(self) -> None:
+        self.investment_data = None
+        self.writes.discard()
+
+
+class SqliteStorage(Storage):
+    """
+    one SQLite database in WAL mode, so the dashboard can read while the tracker writes.
+    every NAV is a (scheme_code, nav_date) row: saving after an update upserts the rows from the
+    last stored date on instead of rewriting the whole history of every fund
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS holdings (
+            scheme_code TEXT PRIMARY KEY,
+            units REAL NOT NULL,
+            invested REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS pending_orders (
+            scheme_code TEXT NOT NULL,
+            order_date INTEGER NOT NULL,
+            units REAL NOT NULL,
+            amount REAL NOT NULL,
+            PRIMARY KEY (scheme_code, order_date)
+        );
+        CREATE TABLE IF NOT EXISTS portfolio (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS funds (
+            scheme_code TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS navs (
+            scheme_code TEXT NOT NULL,
+            nav_date INTEGER NOT NULL,
+            nav REAL NOT NULL,
+            PRIMARY KEY (scheme_code, nav_date)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, path: str | pathlib.Path, migrate_from: Optional[Storage] = None):
+        """
+        migrate_from: imported once into a database that has no record of a finished import,
+        e.g. the existing JSON files
+        """
+        self.path = pathlib.Path(path)
+        self.connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+        self.migrate_from = None if self._migrated() else migrate_from
+        self.migration_lock = asyncio.Lock()
+        self.pending: dict[str, Any] = {}
+        self.resync: set[str] = set()
+        self.nav_marks: dict[str, tuple[int, int]] = {}  # last stored NAV date and NAV count per fund
+        self.data_version = self._data_version()
+
+    def _data_version(self) -> int:
+        """
+        changes whenever another connection commits
+        """
+        return self.connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _migrated(self) -> bool:
+        """
+        the import commits in one transaction with its meta row, a database holding data without the
+        row was created before the meta table existed
+        """
+        return any(
+            self.connection.execute(query, parameters).fetchone() is not None
+            for query, parameters in (
+                ("SELECT 1 FROM meta WHERE key = ?", (MIGRATED_KEY,)),
+                ("SELECT 1 FROM holdings LIMIT 1", ()),
+                ("SELECT 1 FROM portfolio LIMIT 1", ()),
+            )
+        )
+
+    async def _migrate(self) -> None:
+        """
+        the loaders of one command run concurrently, the first one imports while the others wait for
+        it instead of reading the still empty tables
+        """
+        if self.migrate_from is None:
+            return
+        async with self.migration_lock:
+            if self.migrate_from is None:
+                return
+            logging.info("--importing the JSON data files into %s--", self.path)
+            for load, save in (
+                    (self.migrate_from.load_units, self.save_units),
+                    (self.migrate_from.load_orders, self.save_orders),
+                    (self.migrate_from.load_investment_data, self.save_investment_data),
+            ):
+                try:
+                    save(await load())
+                except (FileNotFoundError, ValueError) as error:
+                    logging.warning("--nothing to import: %r--", error)
+                except BaseException:
+                    self.discard()
+                    raise
+            self.pending[MIGRATED_KEY] = True
+            await self.flush()
+            self.migrate_from = None
+
+    def _read_units(self) -> Units:
+        rows = self.connection.execute("SELECT scheme_code, units, invested FROM holdings")
+        return {scheme_code: [units, invested] for scheme_code, units, invested in rows}
+
+    def _read_orders(self) -> Orders:
+        rows = self.connection.execute(
+            "SELECT scheme_code, order_date, units, amount FROM pending_orders ORDER BY scheme_code, order_date"
+        )
+        return {
+            scheme_code: {format_nav_date(date): [units, amount] for _, date, units, amount in orders}
+            for scheme_code, orders in groupby(rows, key=lambda row: row[0])
+        }
+
+    async def load_units(self) -> Units:
+        await self._migrate()
+        return self._read_units()
+
+    async def load_orders(self) -> Orders:
+        await self._migrate()
+        return self._read_orders()
+
+    async def load_investment_data(self) -> InvestmentData:
+        await self._migrate()
+        return self._read_investment_data()
+
+    def _read_investment_data(self) -> InvestmentData:
+        data = get_investment_data(
+            {key: json.loads(value) for key, value in self.connection.execute("SELECT key, value FROM portfolio")}
+        )
+        navs = {
+            scheme_code: NavSeries(*zip(*((date, nav) for _, date, nav in rows)))
+            for scheme_code, rows in groupby(
+                self.connection.execute("SELECT scheme_code, nav_date, nav FROM navs ORDER BY scheme_code, nav_date"),
+                key=lambda row: row[0],
+            )
+        }
+        for scheme_code, fund_data in self.connection.execute("SELECT scheme_code, data FROM funds"):
+            fund = json.loads(fund_data)
+            fund["nav"] = navs.get(scheme_code, NavSeries())
+            data.funds[scheme_code] = get_nav_data(fund)
+        self.nav_marks = {scheme_code: (nav.dates[-1], len(nav)) for scheme_code, nav in navs.items()}
+        return data
+
+    def save_units(self, units: Units | Callable[[], Units]) -> None:
+        self.pending["units"] = units
+
+    def save_orders(self, orders: Orders | Callable[[], Orders]) -> None:
+        self.pending["orders"] = orders
+
+    def save_investment_data(self, data: InvestmentData) -> None:
+        self.pending["investment_data"] = data
+
+    def resync_nav(self, fund_ids: Iterable[str]) -> None:
+        self.resync.update(fund_ids)
+
+    def _write_units(self, units: Units) -> None:
+        self.connection.execute("DELETE FROM holdings")
+        self.connection.executemany(
+            "INSERT INTO holdings (scheme_code, units, invested) VALUES (?, ?, ?)",
+            ((scheme_code, units, invested) for scheme_code, (units, invested) in units.items()),
+        )
+
+    def _write_orders(self, orders: Orders) -> None:
+        self.connection.execute("DELETE FROM pending_orders")
+        self.connection.executemany(
+            "INSERT INTO pending_orders (scheme_code, order_date, units, amount) VALUES (?, ?, ?, ?)",
+            (
+                (scheme_code, to_ordinal(date), units, amount)
+                for scheme_code, fund_orders in orders.items()
+                for date, (units, amount) in fund_orders.items()
+            ),
+        )
+
+    def _write_investment_data(self, data: InvestmentData) -> dict[str, tuple[int, int]]:
+        """
+        returns the new last stored NAV date and NAV count per fund, taken over once the transaction
+        committed
+        """
+        self.connection.executemany(
+            "INSERT INTO portfolio (key, value) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            ((key, json.dumps(value)) for key, value in investment_data_to_dict(data, with_funds=False).items()),
+        )
+        removed = [
+            (scheme_code,)
+            for (scheme_code,) in self.connection.execute("SELECT scheme_code FROM funds").fetchall()
+            if scheme_code not in data.funds
+        ]
+        self.connection.executemany("DELETE FROM funds WHERE scheme_code = ?", removed)
+        self.connection.executemany("DELETE FROM navs WHERE scheme_code = ?", removed)
+
+        self.connection.executemany(
+            "INSERT INTO funds (scheme_code, data) VALUES (?, ?) "
+            "ON CONFLICT (scheme_code) DO UPDATE SET data = excluded.data",
+            (
+                (scheme_code, json.dumps(nav_data_to_dict(fund, with_nav=False)))
+                for scheme_code, fund in data.funds.items()
+            ),
+        )
+        rows, marks = 0, {}
+        for scheme_code, fund in data.funds.items():
+            if not fund.nav:
+                continue
+            mark = self.nav_marks.get(scheme_code)
+            # the last stored date is included, a corrected NAV for it replaces the stored one
+            start = 0 if mark is None else bisect_left(fund.nav.dates, mark[0])
+            if mark is None or scheme_code in self.resync or start != mark[1] - 1:
+                # new, back filled, or a NAV was inserted before the last stored date
+                self.connection.execute("DELETE FROM navs WHERE scheme_code = ?", (scheme_code,))
+                start = 0
+            self.connection.executemany(
+                "INSERT INTO navs (scheme_code, nav_date, nav) VALUES (?, ?, ?) "
+                "ON CONFLICT (scheme_code, nav_date) DO UPDATE SET nav = excluded.nav",
+                ((scheme_code, date, nav) for date, nav in zip(fund.nav.dates[start:], fund.nav.navs[start:])),
+            )
+            rows += len(fund.nav) - start
+            marks[scheme_code] = (fund.nav.dates[-1], len(fund.nav))
+        logging.info("--upserting %s NAV rows of %s funds--", rows, len(data.funds))
+        return marks
+
+    def external_changes(self) -> ExternalChanges:
+        data_version = self._data_version()
+        if data_version == self.data_version:
+            return ExternalChanges()
+        logging.info("--reloading the data changed in %s--", self.path)
+        self.data_version = data_version
+        return ExternalChanges(self._read_units(), self._read_orders(), self._read_investment_data())
+
+    async def flush(self) -> None:
+        pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        with self.connection:
+            if "units" in pending:
+                self._write_units(_resolve(pending["units"]))
+            if "orders" in pending:
+                self._write_orders(_resolve(pending["orders"]))
+            marks = (
+                self._write_investment_data(pending["investment_data"]) if "investment_data" in pending else None
+            )
+            if MIGRATED_KEY in pending:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (MIGRATED_KEY, "json")
+                )
+        if marks is not None:
+            self.nav_marks = marks
+            self.resync.clear()
+        logging.info("--committed %s to %s--", ", ".join(pending), self.path)
+
+    def discard(self) -> None:
+        self.pending.clear()
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def get_storage(data_path: str | pathlib.Path, download: Downloader, writes: WriteBehind) -> Storage:
+    """
+    the backend picked by the MF_STORAGE environment variable, a new SQLite database starts
+    from the JSON files
+    """
+    json_storage = JsonStorage(data_path, download, writes)
+    if os.environ.get(STORAGE_ENV, "json").lower() != "sqlite":
+        return json_storage
+    return SqliteStorage(pathlib.Path(data_path).joinpath(SQLITE_FILE_NAME), migrate_from=json_storage)
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+from util.serializer import dumps, serializer_for
+
+Uploader = Callable[[pathlib.Path], Awaitable[None]]
+
+
+@dataclass
+class WriteStats:
+    requested: int = 0
+    written: int = 0
+    unchanged: int = 0
+    uploaded: int = 0
+
+    @property
+    def saved(self) -> int:
+        """
+        writes (and uploads) that were collapsed into another one or skipped as unchanged
+        """
+        return self.requested - self.written
+
+
+class WriteBehind:
+    """
+    collects the data file writes of one run (or one daemon poll), per file the last one wins.
+    flush serializes every dirty file once (in the file's configured format), writes it once
+    (atomically) and uploads it once, a file whose content is the same as at the previous flush
+    is neither written nor uploaded
+    """
+
+    def __init__(self, upload: Optional[Uploader] = None):
+        self.upload = upload
+        self.pending: dict[pathlib.Path, Any] = {}
+        self.digests: dict[pathlib.Path, str] = {}
+        self.stats = WriteStats()
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def write(self, path: pathlib.Path, data: Any | Callable[[], Any]) -> None:
+        """
+        data can be a callable, it is then only called at flush so the file gets the latest state
+        """
+        self.stats.requested += 1
+        self.pending[pathlib.Path(path)] = data
+
+    def discard(self) -> None:
+        self.pending.clear()
+
+    def _write_file(self, path: pathlib.Path, content: bytes) -> None:
+        fd, temp_name = tempfile.mkstemp(dir=path.parent, suffix=".part")
+        with os.fdopen(fd, "wb") as file:
+            file.write(content)
+        os.replace(temp_name, path)
+
+    async def flush(self) -> WriteStats:
+        pending, self.pending = self.pending, {}
+        changed = []
+        for path, data in pending.items():
+            content = dumps(data() if callable(data) else data, serializer_for(path))
+            digest = hashlib.md5(content).hexdigest()
+            if self.digests.get(path) == digest:
+                self.stats.unchanged += 1
+                continue
+            logging.info("writing %s", path)
+            self._write_file(path, content)
+            self.digests[path] = digest
+            self.stats.written += 1
+            changed.append(path)
+
+        if self.upload is not None and changed:
+            await asyncio.gather(*(self.upload(path) for path in changed))
+            self.stats.uploaded += len(changed)
+        if pending:
+            logging.info(
+                "--flushed %s of %s dirty files, %s writes saved so far (%s requested, %s written)--",
+                len(changed), len(pending), self.stats.saved, self.stats.requested, self.stats.written,
+            )
+        return self.stats